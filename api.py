@@ -1,25 +1,40 @@
 import time
-import configparser
+import asyncio
 from datetime import datetime
 from bot.core.http.navigator import Browser
-from bot.core.http.hcaptcha import hcaptcha_solver
-
-config = configparser.ConfigParser()
-config.read('settings/config.ini', encoding="utf-8")
-
-host = config.get("server", "host")
-port = config.getint("server", "port")
-site_key = config.get("hcaptcha", "site_key")
+from collections import deque
+from bot.transport import AsyncTransport, PreparedRequest
+from bot.scheduler import PollScheduler, parse_timestamp
+from bot.singleflight import SingleFlight
+from bot.metrics import metrics
+from bot.config import get_config, server_url
+from bot.wallet import BalanceTracker
 
 URL_BASE = "https://blaze.com"
-URL_SERVER = f"http://{host}:{port}"
 URL_HCAPTCHA_API = "http://104.152.186.57:63098"
 VERSION_API = "0.0.1-professional"
+LAZY_SETTINGS = {
+    "config": get_config,
+    "host": lambda: get_config().get("server", "host"),
+    "port": lambda: get_config().getint("server", "port"),
+    "site_key": lambda: get_config().get("hcaptcha", "site_key"),
+    "URL_SERVER": server_url,
+}
+
+
+def __getattr__(name):
+    if name in LAZY_SETTINGS:
+        return LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class BlazeClientAPI(Browser):
+    flight = SingleFlight(ttl=0.05)
+    url_base = URL_BASE
 
-    def __init__(self, username=None, password=None):
+    def __init__(self, username=None, password=None, transport=None):
         super().__init__()
+        self._url_server = None
         self.proxies = None
         self.token = None
         self.hcaptcha_token = None
@@ -27,8 +42,29 @@ class BlazeClientAPI(Browser):
         self.wallet_id = None
         self.username = username
         self.password = password
+        self.transport = transport or AsyncTransport()
+        self.channels = {}
+        self.stats = {}
+        self.signals = {}
+        self.histories = {}
+        self.schedulers = {}
+        self.bet_latencies = deque(maxlen=100)
+        self.wallet = BalanceTracker(self.fetch_wallet)
+        self.profile = None
         self.set_headers()
         self.headers = self.get_headers()
+        self.read_headers = self.get_headers()
+
+    @property
+    def url_server(self):
+        # only the fallback result endpoint needs it, so clients build without settings/config.ini
+        if self._url_server is None:
+            self._url_server = server_url()
+        return self._url_server
+
+    @url_server.setter
+    def url_server(self, value):
+        self._url_server = value
 
     def authorization(self, token=None):
         if token:
@@ -45,9 +81,9 @@ class BlazeClientAPI(Browser):
         }
         timestamp = int(time.time() * 1000)
         self.headers["x-captcha-response"] = self.hcaptcha_token or self.get_captcha_token()
-        self.headers["referer"] = f"{URL_BASE}/pt/?modal=auth&tab=login"
+        self.headers["referer"] = f"{self.url_base}/pt/?modal=auth&tab=login"
         self.response = self.send_request("PUT",
-                                          f"{URL_BASE}/api/auth/password?analyticSessionID={timestamp}",
+                                          f"{self.url_base}/api/auth/password?analyticSessionID={timestamp}",
                                           json=data,
                                           headers=self.headers)
         if not self.response.json().get("error"):
@@ -70,41 +106,49 @@ class BlazeClientAPI(Browser):
         return None
 
     def get_captcha_token(self):
-        site_url = f"{URL_BASE}/api/auth/password"
+        site_url = f"{self.url_base}/api/auth/password"
         response_result = self.hcaptcha_response()
         if not response_result:
-            response_result = hcaptcha_solver(site_url, site_key)
+            from bot.core.http.hcaptcha import hcaptcha_solver
+            response_result = hcaptcha_solver(site_url, get_config().get("hcaptcha", "site_key"))
         return response_result
 
     def get_profile(self):
         self.headers["authorization"] = f"Bearer {self.token}"
         self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/users/me",
+                                          f"{self.url_base}/api/users/me",
                                           headers=self.headers)
         if not self.response.json().get("error"):
             self.is_logged = True
         return self.response.json()
 
-    def get_balance(self):
-        self.headers["referer"] = f"{URL_BASE}/pt/games/double"
+    def fetch_wallet(self):
+        self.headers["referer"] = f"{self.url_base}/pt/games/double"
         self.headers["authorization"] = f"Bearer {self.token}"
         self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/wallets",
+                                          f"{self.url_base}/api/wallets",
                                           headers=self.headers)
         if self.response.status_code == 502:
             self.reconnect()
-            return self.get_balance()
+            return None
         try:
             data = self.response.json()[0]
             self.wallet_id = data["id"]
             return data
         except Exception as e:
-            return {}
+            return None
+
+    def get_balance(self, force=False):
+        return self.wallet.get(force) or {}
 
     def get_user_info(self):
         result_dict = {}
         balance = self.get_balance()
-        user_info = self.get_profile()
+        if self.profile is None:
+            profile = self.get_profile()
+            if not profile.get("error"):
+                self.profile = profile
+        user_info = self.profile or {}
         result_dict["username"] = user_info["username"]
         result_dict["balance"] = balance["balance"]
         result_dict["wallet_id"] = balance["id"]
@@ -112,105 +156,317 @@ class BlazeClientAPI(Browser):
         return result_dict
 
     def get_result(self, game):
-        self.headers = self.get_headers()
         result = self.get_current(game)
         if not result:
             self.response = self.send_request("GET",
-                                              f"{URL_SERVER}/api/v1/{game}/result",
-                                              headers=self.headers)
+                                              f"{self.url_server}/api/v1/{game}/result",
+                                              headers=self.read_headers)
         return self.response.json()
 
+    def send_request(self, method, url, **kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = super().send_request(method, url, **kwargs)
+            return response
+        finally:
+            metrics.record_request(method, url, getattr(response, "status_code", "error"),
+                                   time.perf_counter() - started)
+
+    def fetch_shared(self, url, **kwargs):
+        response = self.send_request("GET", url, **kwargs)
+        # read the body once in the leader so waiters never race on it
+        response.content
+        return response
+
+    def shared_request(self, url, params=None, **kwargs):
+        key = self.flight.make_key("GET", url, params)
+        self.response = self.flight.do(key, lambda: self.fetch_shared(url, params=params, **kwargs))
+        return self.response
+
+    async def async_send_request(self, method, url, **kwargs):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.transport.request(method, url, **kwargs)
+            return response
+        finally:
+            metrics.record_request(method, url, getattr(response, "status_code", "error"),
+                                   time.perf_counter() - started)
+
+    async def async_shared_request(self, url, params=None, **kwargs):
+        key = self.flight.make_key("GET", url, params)
+        return await self.flight.async_do(key, lambda: self.async_send_request("GET", url, params=params, **kwargs))
+
+    async def async_get_current(self, game="double"):
+        url_path = "roulette"
+        if game == "crash":
+            url_path = "crash"
+        response = await self.async_shared_request(f"{self.url_base}/api/{url_path}_games/current",
+                                                   proxies=self.proxies,
+                                                   headers=self.read_headers)
+        if response:
+            return response
+        return None
+
+    def get_scheduler(self, game):
+        if game not in self.schedulers:
+            self.schedulers[game] = PollScheduler(game)
+        return self.schedulers[game]
+
+    async def async_get_result(self, game):
+        scheduler = self.get_scheduler(game)
+        scheduler.requests += 1
+        response = await self.async_get_current(game)
+        if not response:
+            scheduler.requests += 1
+            response = await self.async_send_request("GET",
+                                                     f"{self.url_server}/api/v1/{game}/result",
+                                                     headers=self.read_headers)
+        return response
+
+    async def close(self):
+        await self.transport.close()
+
     def get_status(self, game):
         self.response = self.get_result(game)
         if self.response:
             return self.response.get("status")
         return {"status": "unknown"}
 
-    def get_message(self):
+    def get_message(self, response=None):
         error = "Erro, aposta não concluída!!!"
         success = "Operação realizada com sucesso!!!"
-        return success if self.response else error
+        if response is None:
+            response = self.response
+        return success if response else error
 
-    def double_bets(self, color, amount):
-        data = {
+    def bet_headers(self):
+        headers = dict(self.read_headers)
+        headers["authorization"] = f"Bearer {self.token}"
+        return headers
+
+    def bet_result(self, response):
+        result_dict = {
+            "result": True if response else False,
+            "object": response.json(),
+            "message": self.get_message(response)
+        }
+        return result_dict
+
+    def track_bet(self, game, response, data):
+        if not response:
+            self.wallet.invalidate()
+        elif not data:
+            self.wallet.cashout(game)
+        else:
+            self.wallet.debit(game, data["amount"], data.get("color"), data.get("auto_cashout_at"))
+
+    def double_bet_data(self, color, amount):
+        return {
             "amount": amount,
             "currency_type": "BRL",
             "color": 1 if color == "vermelho" else 2 if color == "preto" else 0,
             "free_bet": False,
             "wallet_id": self.wallet_id
         }
-        self.headers["authorization"] = f"Bearer {self.token}"
-        self.response = self.send_request("POST",
-                                          f"{URL_BASE}/api/roulette_bets",
-                                          json=data,
-                                          headers=self.headers)
-        result_dict = {
-            "result": True if self.response else False,
-            "object": self.response.json(),
-            "message": self.get_message()
-        }
-        return result_dict
 
-    def crash_bets(self, amount, cashout=2):
-        data = {
+    def crash_bet_data(self, amount, cashout=2):
+        return {
             "amount": amount,
             "type": "BRL",
             "auto_cashout_at": cashout,
             "wallet_id": self.wallet_id
         }
-        self.headers["authorization"] = f"Bearer {self.token}"
+
+    def double_bets(self, color, amount):
+        data = self.double_bet_data(color, amount)
         self.response = self.send_request("POST",
-                                          f"{URL_BASE}/api/crash/round/enter",
+                                          f"{self.url_base}/api/roulette_bets",
                                           json=data,
-                                          headers=self.headers)
-        result_dict = {
-            "result": True if self.response else False,
-            "object": self.response.json(),
-            "message": self.get_message()
-        }
-        return result_dict
+                                          headers=self.bet_headers())
+        self.track_bet("double", self.response, data)
+        return self.bet_result(self.response)
 
-    def crash_cashout(self):
-        data = {}
-        self.headers["authorization"] = f"Bearer {self.token}"
+    def crash_bets(self, amount, cashout=2):
+        data = self.crash_bet_data(amount, cashout)
         self.response = self.send_request("POST",
-                                          f"{URL_BASE}/api/crash/round/cashout",
+                                          f"{self.url_base}/api/crash/round/enter",
                                           json=data,
-                                          headers=self.headers)
-        result_dict = {
-            "result": True if self.response else False,
-            "object": self.response.json(),
-            "message": self.get_message()
+                                          headers=self.bet_headers())
+        self.track_bet("crash", self.response, data)
+        return self.bet_result(self.response)
+
+    def crash_cashout(self):
+        self.response = self.send_request("POST",
+                                          f"{self.url_base}/api/crash/round/cashout",
+                                          json={},
+                                          headers=self.bet_headers())
+        self.track_bet("crash", self.response, {})
+        return self.bet_result(self.response)
+
+    def prepare_double_bet(self, color, amount):
+        return PreparedRequest("POST", f"{self.url_base}/api/roulette_bets",
+                               self.double_bet_data(color, amount), self.bet_headers())
+
+    def prepare_crash_bet(self, amount, cashout=2):
+        return PreparedRequest("POST", f"{self.url_base}/api/crash/round/enter",
+                               self.crash_bet_data(amount, cashout), self.bet_headers())
+
+    def prepare_crash_cashout(self):
+        return PreparedRequest("POST", f"{self.url_base}/api/crash/round/cashout", {}, self.bet_headers())
+
+    def round_opened_at(self, game):
+        scheduler = self.schedulers.get(game)
+        return scheduler.opened_at() if scheduler is not None else None
+
+    def betting_time_left(self, game):
+        scheduler = self.schedulers.get(game)
+        return scheduler.time_left() if scheduler is not None else None
+
+    async def place_bet(self, prepared, game="double"):
+        opened_at = self.round_opened_at(game)
+        submitted_at = time.time()
+        response = None
+        try:
+            response = await self.transport.send(prepared, proxies=self.proxies)
+        finally:
+            accepted_at = time.time()
+            metrics.record_request(prepared.method, prepared.url, getattr(response, "status_code", "error"),
+                                   accepted_at - submitted_at)
+        if opened_at is not None:
+            metrics.observe("bet_submitted_seconds", submitted_at - opened_at, game=game)
+        if response and opened_at is not None:
+            self.bet_latencies.append(accepted_at - opened_at)
+            metrics.observe("bet_accepted_seconds", accepted_at - opened_at, game=game)
+        self.track_bet(game, response, prepared.data)
+        return self.bet_result(response)
+
+    async def async_double_bets(self, color, amount):
+        return await self.place_bet(self.prepare_double_bet(color, amount), "double")
+
+    async def async_crash_bets(self, amount, cashout=2):
+        return await self.place_bet(self.prepare_crash_bet(amount, cashout), "crash")
+
+    async def async_crash_cashout(self):
+        return await self.place_bet(self.prepare_crash_cashout(), "crash")
+
+    async def warm_up(self, connections=2, interval=30):
+        url = f"{self.url_base}/api/roulette_games/current"
+        await self.transport.warmup(url, connections=connections, headers=self.read_headers, proxies=self.proxies)
+        return self.transport.start_keep_warm(url, interval=interval, connections=connections,
+                                              headers=self.read_headers, proxies=self.proxies)
+
+    def bet_latency_report(self):
+        latencies = sorted(self.bet_latencies)
+        if not latencies:
+            return {"count": 0}
+        return {
+            "count": len(latencies),
+            "min": latencies[0],
+            "p50": latencies[len(latencies) // 2],
+            "max": latencies[-1],
+            "average": sum(latencies) / len(latencies)
         }
-        return result_dict
 
-    async def awaiting_double(self, verbose=True):
+    @staticmethod
+    def is_finished(game, data):
+        if game == "crash":
+            return data["crash_point"] is not None
+        return data["color"] is not None and data["roll"] is not None
+
+    async def polling_result(self, game, verbose=True):
+        scheduler = self.get_scheduler(game)
         while True:
+            data = None
             try:
-                self.response = self.get_result("double")
+                data = self.response = (await self.async_get_result(game)).json()
                 if verbose:
                     print(f'\rSTATUS: {self.response["status"]}', end="")
-                if self.response["color"] is not None and self.response["roll"] is not None:
+                if self.is_finished(game, self.response):
+                    scheduler.observe(data)
                     return self.response
             except Exception as e:
                 pass
-            time.sleep(0.1)
+            await asyncio.sleep(scheduler.next_delay(data))
 
-    async def awaiting_crash(self, verbose=True):
-        while True:
+    def use_channel(self, game, channel):
+        if channel is None:
+            channel = self.channels.pop(game, None)
+            if channel is not None and channel.scheduler is not None and self.schedulers.get(game) is channel.scheduler:
+                del self.schedulers[game]
+        else:
+            self.channels[game] = channel
+            if channel.scheduler is not None:
+                # bets are timed against the round opening the channel saw
+                self.schedulers[game] = channel.scheduler
+
+    def use_stats(self, game, stats):
+        if stats is None:
+            self.stats.pop(game, None)
+        else:
+            self.stats[game] = stats
+
+    def observe_stats(self, game, data):
+        stats = self.stats.get(game)
+        if stats is not None and data:
             try:
-                self.response = self.get_result("crash")
-                if verbose:
-                    print(f'\rSTATUS: {self.response["status"]}', end="")
-                if self.response["crash_point"] is not None:
-                    return self.response
+                stats.update(data)
             except Exception as e:
                 pass
-            time.sleep(0.1)
 
-    async def get_double(self):
+    def use_history(self, game, store, sync=True):
+        if store is None:
+            self.histories.pop(game, None)
+            return
+        self.histories[game] = store
+        if sync:
+            store.sync(self)
+
+    async def observe_history(self, game, data):
+        store = self.histories.get(game)
+        if store is None or not data:
+            return
+        try:
+            if not data.get("created_at"):
+                # without a timestamp the round cannot be placed, let the server fill the store
+                await asyncio.to_thread(store.sync, self)
+                return
+            last = store.last_timestamp
+            created_at = int(parse_timestamp(data["created_at"]) * 1000)
+            if last is not None and created_at <= last:
+                return
+            previous = store.last(2)["created_at"]
+            interval = int(previous[1] - previous[0]) if len(previous) == 2 else None
+            if last is not None and interval and created_at - last > 1.5 * interval:
+                # rounds were missed between two reads, fetch them instead of leaving a gap
+                await asyncio.to_thread(store.sync, self)
+            else:
+                store.append([data])
+        except Exception as e:
+            print(f"Erro ao atualizar o histórico de {game}: {e}")
+
+    async def awaiting_result(self, game, verbose=True, timeout=None):
+        channel = self.channels.get(game)
+        waiter = channel.wait_result() if channel else self.polling_result(game, verbose=verbose)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def awaiting_double(self, verbose=True, timeout=None):
+        return await self.awaiting_result("double", verbose=verbose, timeout=timeout)
+
+    async def awaiting_crash(self, verbose=True, timeout=None):
+        return await self.awaiting_result("crash", verbose=verbose, timeout=timeout)
+
+    async def get_double(self, timeout=None):
         result_dict = None
-        data = await self.awaiting_double(verbose=False)
+        data = await self.awaiting_double(verbose=False, timeout=timeout)
+        self.signals["double"] = data.get("signals", []) if data else []
+        self.observe_stats("double", data)
+        await self.observe_history("double", data)
+        self.wallet.settle("double", data)
         if data:
             result_dict = {
                 "roll": data["roll"],
@@ -218,68 +474,76 @@ class BlazeClientAPI(Browser):
             }
         return result_dict
 
-    async def get_crash(self):
+    async def get_crash(self, timeout=None):
         result_dict = None
-        data = await self.awaiting_crash(verbose=False)
+        data = await self.awaiting_crash(verbose=False, timeout=timeout)
+        self.signals["crash"] = data.get("signals", []) if data else []
+        self.observe_stats("crash", data)
+        await self.observe_history("crash", data)
+        self.wallet.settle("crash", data)
         if data:
             result_dict = {
                 "point": data["crash_point"],
             }
         return result_dict
 
-    def get_last_doubles(self):
-        self.headers["referer"] = f"{URL_BASE}/pt/games/double"
-        self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/roulette_games/recent",
-                                          proxies=self.proxies,
-                                          headers=self.headers)
+    def get_recent(self, game="double"):
+        url_path = "roulette"
+        if game == "crash":
+            url_path = "crash"
+        self.headers["referer"] = f"{self.url_base}/pt/games/{game}"
+        self.response = self.shared_request(f"{self.url_base}/api/{url_path}_games/recent",
+                                            proxies=self.proxies,
+                                            headers=self.headers)
         if self.response:
+            return self.response.json()
+        return None
+
+    def get_last_doubles(self):
+        if "double" in self.histories:
+            return self.histories["double"].last_items()
+        items = self.get_recent("double")
+        if items is not None:
             result = {
                 "items": [
                     {"color": "branco" if i["color"] == 0 else "vermelho" if i["color"] == 1 else "preto",
                      "value": i["roll"], "created_date": datetime.strptime(
                         i["created_at"], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S")
-                     } for i in self.response.json()]}
+                     } for i in items]}
             return result
         return False
 
     def get_last_crashs(self):
-        self.headers["referer"] = f"{URL_BASE}/pt/games/crash"
-        self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/crash_games/recent",
-                                          proxies=self.proxies,
-                                          headers=self.headers)
-        if self.response:
+        if "crash" in self.histories:
+            return self.histories["crash"].last_items()
+        items = self.get_recent("crash")
+        if items is not None:
             result = {
                 "items": [{"color": "preto" if float(i["crash_point"]) < 2 else "verde", "point": i["crash_point"]}
-                          for i in self.response.json()]}
+                          for i in items]}
             return result
         return False
 
     def get_current(self, game="double"):
-        self.headers = self.get_headers()
         url_path = "roulette"
         if game == "crash":
             url_path = "crash"
-        self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/{url_path}_games/current",
-                                          proxies=self.proxies,
-                                          headers=self.headers)
+        self.response = self.shared_request(f"{self.url_base}/api/{url_path}_games/current",
+                                            proxies=self.proxies,
+                                            headers=self.read_headers)
         if self.response:
             return self.response
         return None
 
     def get_history(self, game="double", pages=1):
-        self.headers = self.get_headers()
         url_path = "roulette"
         if game == "crash":
             url_path = "crash"
         payload = {
             "page": pages
         }
-        self.response = self.send_request("GET",
-                                          f"{URL_BASE}/api/{url_path}_games/history",
-                                          params=payload,
-                                          proxies=self.proxies,
-                                          headers=self.headers)
+        self.response = self.shared_request(f"{self.url_base}/api/{url_path}_games/history",
+                                            params=payload,
+                                            proxies=self.proxies,
+                                            headers=self.read_headers)
         return self.response.json()
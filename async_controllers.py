@@ -0,0 +1,157 @@
+from contextlib import asynccontextmanager
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from bot.controllers import UserController
+from bot.metrics import metrics
+from bot.models import copy_bundle
+from bot.db.database import engine
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+AsyncDBSession = None
+
+
+def async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if url.drivername in ASYNC_DRIVERS.values() or backend not in ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_session_factory(url=None, pool_size=20, max_overflow=10, pool_timeout=30):
+    url = async_url(url or engine.url)
+    options = {"pool_pre_ping": True}
+    if url.get_backend_name() != "sqlite" or (url.database and url.database != ":memory:"):
+        # one event loop serves many bots, so the pool has to cover their concurrent queries
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return sessionmaker(bind=create_async_engine(url, **options), class_=AsyncSession, expire_on_commit=False)
+
+
+def get_async_session_factory():
+    global AsyncDBSession
+    if AsyncDBSession is None:
+        AsyncDBSession = create_async_session_factory()
+    return AsyncDBSession
+
+
+class AsyncUserController(UserController):
+
+    def __init__(self, session_factory=None):
+        super().__init__(unit_of_work=True)
+        self.session_factory = session_factory or get_async_session_factory()
+
+    @asynccontextmanager
+    async def session_scope(self):
+        session = self.session_factory()
+        try:
+            yield session
+            await session.commit()
+        except:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    async def run(self, operation, func, *args, **kwargs):
+        released = {}
+        try:
+            with metrics.operation(operation):
+                async with self.session_scope() as session:
+                    session.sync_session.info["released_counters"] = released
+                    result = await session.run_sync(lambda sync_session: func(sync_session, *args, **kwargs))
+                    changed = session.sync_session.info.pop("changed_users", ())
+                    strategies = session.sync_session.info.pop("changed_strategies", ())
+        except:
+            self.restore_counters(released)
+            raise
+        self.invalidate(*changed)
+        await self.refresh_matcher(*strategies)
+        return result
+
+    async def load_matchers(self):
+        if self.matchers is None:
+            return 0
+        return await self.run("load_matchers", self.apply_load_matchers)
+
+    async def refresh_matcher(self, *bot_ids):
+        bot_ids = [int(bot_id) for bot_id in bot_ids if bot_id is not None]
+        if self.matchers is None or not bot_ids:
+            return
+        await self.run("refresh_matcher", self.apply_refresh_matcher, bot_ids)
+
+    async def create(self, data):
+        return await self.run("create", self.apply_create, data)
+
+    async def check_user_exists(self, bot_id):
+        with metrics.operation("check_user_exists"):
+            key = int(bot_id)
+            bundle = self.cache.get(key)
+            metrics.increment("controller_cache_total", operation="check_user_exists",
+                              result="miss" if bundle is None else "hit")
+            if bundle is not None and self.is_expired(bundle):
+                self.cache.invalidate(key)
+                bundle = None
+            if bundle is None:
+                async with self.session_scope() as session:
+                    bundle = await session.run_sync(lambda sync_session: self.load_bundle(sync_session, bot_id))
+                if not bundle:
+                    return False
+                self.cache.set(key, bundle)
+            if self.is_expired(bundle):
+                return await self.expire(bundle["user"]["id"])
+            return self.overlay_variables(copy_bundle(bundle))
+
+    async def read(self, limit=None, before_id=None, active=None, game_type=None, payment_status=None):
+        return await self.run("read", self.read_users, limit, before_id, active, game_type, payment_status)
+
+    async def iter_users(self, batch_size=500, active=None, game_type=None, payment_status=None):
+        before_id = None
+        while True:
+            page = await self.read(batch_size, before_id, active, game_type, payment_status) or []
+            for bundle in page:
+                yield bundle
+            if len(page) < batch_size:
+                return
+            before_id = page[-1]["user"]["id"]
+
+    async def enable(self, data):
+        return await self.run("enable", self.apply_enable, data)
+
+    async def change_bets_status(self, data):
+        return await self.run("change_bets_status", self.apply_bets_status, data)
+
+    async def change_payment_status(self, data):
+        return await self.run("change_payment_status", self.apply_payment_status, data)
+
+    async def create_trial_access(self, data, **kwargs):
+        return await self.run("create_trial_access", self.apply_trial_access, data, **kwargs)
+
+    async def change_token_status(self, uid, client_id=None, days=None):
+        return await self.run("change_token_status", self.apply_token_status, uid, client_id, days)
+
+    async def expire(self, uid, now=None):
+        return await self.run("expire", self.apply_expire, uid, now)
+
+    async def disable(self, data):
+        await self.run("disable", self.apply_disable, data)
+
+    async def delete(self, uid):
+        await self.run("delete", self.apply_delete, uid)
+        return await self.read()
+
+    async def delete_all_trial(self):
+        await self.run("delete_all_trial", self.apply_delete_all_trial)
+        self.cache.clear()
+        await self.load_matchers()
+        return await self.read()
+
+    async def delete_strategies(self, data, index):
+        await self.run("delete_strategies", self.apply_delete_strategies, data, index)
+
+    async def close(self):
+        await self.session_factory.kw["bind"].dispose()
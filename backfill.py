@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from bot.api import URL_BASE
+from bot.history import HistoryStore
+from bot.transport import AsyncTransport
+
+
+class HistoryBackfill(object):
+
+    def __init__(self, store, base_url=URL_BASE, concurrency=8, batch_size=1000,
+                 checkpoint=None, max_pages=None, retries=3, transport=None, headers=None):
+        self.store = store
+        self.game = store.game
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint or os.path.join(store.path or ".", f"{store.game}.backfill.json")
+        self.max_pages = max_pages
+        self.retries = retries
+        self.transport = transport or AsyncTransport(limit=concurrency)
+        self.headers = headers
+        self.seen = {item.decode() for item in store.arrays["id"][:len(store)]}
+        self.buffer = []
+        self.completed = set()
+        self.next_page = 1
+        self.watermark = 1
+        self.total_pages = None
+        self.incremental = False
+        self.exhausted = False
+        self.fetched = 0
+        self.written = 0
+        self.started = None
+
+    def load_checkpoint(self):
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint, encoding="utf-8") as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state.get("done"):
+                # a finished backfill only needs the pages written since then
+                self.incremental = True
+                return
+            self.watermark = self.next_page = state.get("next_page", 1)
+            self.total_pages = state.get("total_pages")
+
+    def save_checkpoint(self, done=False):
+        temporary = self.checkpoint + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"game": self.game, "next_page": self.watermark, "total_pages": self.total_pages,
+                       "rounds": len(self.store), "done": done}, checkpoint_file)
+        os.replace(temporary, self.checkpoint)
+
+    def url(self):
+        url_path = "crash" if self.game == "crash" else "roulette"
+        return f"{self.base_url}/api/{url_path}_games/history"
+
+    def last_page(self):
+        pages = [page for page in (self.total_pages, self.max_pages) if page]
+        return min(pages) if pages else None
+
+    async def fetch(self, page):
+        for attempt in range(self.retries):
+            try:
+                response = await self.transport.request("GET", self.url(), params={"page": page},
+                                                        headers=self.headers)
+                if response:
+                    return response.json()
+            except Exception as e:
+                if attempt + 1 == self.retries:
+                    raise
+            await asyncio.sleep(2 ** attempt * 0.1)
+        raise RuntimeError(f"Falha ao buscar página {page} do histórico")
+
+    def collect(self, page, data):
+        records = data.get("records", []) if isinstance(data, dict) else data
+        if isinstance(data, dict) and data.get("total_pages"):
+            self.total_pages = data["total_pages"]
+        new = 0
+        for item in records:
+            if str(item["id"]) not in self.seen:
+                self.seen.add(str(item["id"]))
+                self.buffer.append(item)
+                new += 1
+        self.fetched += 1
+        self.completed.add(page)
+        while self.watermark in self.completed:
+            self.completed.discard(self.watermark)
+            self.watermark += 1
+        return len(records), new
+
+    def finished(self):
+        return self.exhausted or bool(self.total_pages and self.watermark > self.total_pages)
+
+    def flush(self):
+        if self.buffer:
+            self.written += self.store.append(self.buffer)
+            self.buffer = []
+        self.save_checkpoint()
+
+    async def worker(self):
+        while True:
+            last_page = self.last_page()
+            if last_page is not None and self.next_page > last_page:
+                return
+            page = self.next_page
+            self.next_page += 1
+            count, new = self.collect(page, await self.fetch(page))
+            if not count or (self.incremental and not new):
+                self.exhausted = True
+                self.max_pages = min(self.max_pages or page, page)
+                return
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    async def run(self, progress=True):
+        self.load_checkpoint()
+        self.started = time.perf_counter()
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # a failed worker must not leave the others appending to the buffer after the flush
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.flush()
+            await self.transport.close()
+        self.store.compact()
+        self.save_checkpoint(done=self.finished())
+        if progress:
+            print(self.report())
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return {
+            "game": self.game,
+            "pages": self.fetched,
+            "rounds": self.written,
+            "seconds": elapsed,
+            "rounds_per_second": self.written / elapsed if elapsed else 0.0
+        }
+
+    def report(self):
+        stats = self.stats()
+        return f"{stats['game']}: {stats['rounds']} rodadas em {stats['pages']} páginas " \
+               f"({stats['rounds_per_second']:.0f} rodadas/s)"
+
+
+async def backfill(game="double", path="history", base_url=URL_BASE, max_pages=None, concurrency=8):
+    store = HistoryStore(game, path)
+    return await HistoryBackfill(store, base_url=base_url, max_pages=max_pages, concurrency=concurrency).run()
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    asyncio.run(backfill(*arguments[:3], *map(int, arguments[3:5])))
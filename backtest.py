@@ -0,0 +1,170 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from bot.matcher import StrategyMatcher, COLOR_CODES
+
+COLOR_PAYOUT = 2.0
+WHITE_PAYOUT = 14.0
+COUNTERS = ("count_win", "count_loss", "count_martingale", "profit", "max_drawdown")
+DEFAULTS = {
+    "enter_type": "VALOR",
+    "enter_value": 2.0,
+    "enter_percent": 0.5,
+    "stop_type": "VALOR",
+    "stop_gain": 100.0,
+    "stop_loss": 30.0,
+    "protection_hand": "NÃO",
+    "protection_value": 1.8,
+    "martingale": 2,
+    "white_martingale": "NÃO",
+    "martingale_multiplier": 2.0,
+    "white_multiplier": 2.0,
+}
+
+
+def is_yes(value):
+    return str(value).strip().upper() in ("SIM", "S", "TRUE", "1", "YES")
+
+
+def parameters(settings):
+    # Settings rows keep flags as "SIM"/"NÃO" and stops as strings
+    rows = [dict(DEFAULTS, **{key: value for key, value in dict(item).items() if value is not None})
+            for item in settings]
+    return {
+        "percent": np.array([str(row["enter_type"]).upper().startswith("PORC") or
+                             str(row["enter_type"]).upper().startswith("PERC") for row in rows]),
+        "enter_value": np.array([float(row["enter_value"]) for row in rows]),
+        "enter_percent": np.array([float(row["enter_percent"]) for row in rows]),
+        "stop_percent": np.array([str(row["stop_type"]).upper() != "VALOR" for row in rows]),
+        "stop_gain": np.array([float(row["stop_gain"]) for row in rows]),
+        "stop_loss": np.array([float(row["stop_loss"]) for row in rows]),
+        "protection": np.array([is_yes(row["protection_hand"]) for row in rows]),
+        "protection_value": np.array([float(row["protection_value"]) for row in rows]),
+        "martingale": np.array([int(row["martingale"]) for row in rows]),
+        "white_martingale": np.array([is_yes(row["white_martingale"]) for row in rows]),
+        "martingale_multiplier": np.array([float(row["martingale_multiplier"]) for row in rows]),
+        "white_multiplier": np.array([float(row["white_multiplier"]) for row in rows]),
+    }
+
+
+def grid(**options):
+    keys = list(options)
+    return [dict(zip(keys, values)) for values in itertools.product(*(options[key] for key in keys))]
+
+
+def signals(game, colors, strategies):
+    matcher = StrategyMatcher(game)
+    codes = COLOR_CODES[game]
+    for index, (sequence, target) in enumerate(strategies):
+        matcher.add(0, index, sequence, codes[str(target).strip().lower()])
+    targets = np.full(len(colors), -1, dtype=np.int8)
+    for index, color in enumerate(colors.tolist()):
+        matches = matcher.step(color)
+        if matches:
+            targets[index] = matches[0][2]
+    return targets
+
+
+def simulate(colors, targets, days, params, balance=100.0, white=True):
+    size = len(params["martingale"])
+    level = np.full(size, -1)
+    target = np.zeros(size, dtype=np.int8)
+    base = np.zeros(size)
+    white_base = np.zeros(size)
+    wallet = np.full(size, float(balance))
+    session_start = wallet.copy()
+    profit = np.zeros(size)
+    peak = np.zeros(size)
+    drawdown = np.zeros(size)
+    stopped = np.zeros(size, dtype=bool)
+    counters = {key: np.zeros(size, dtype=np.int64) for key in ("count_win", "count_loss", "count_martingale")}
+    multiplier = params["martingale_multiplier"]
+    white_multiplier = np.where(params["white_martingale"], params["white_multiplier"], 1.0)
+    protection = params["protection"] & white
+    stop_gain = np.where(params["stop_percent"], params["stop_gain"] / 100 * balance, params["stop_gain"])
+    stop_loss = np.where(params["stop_percent"], params["stop_loss"] / 100 * balance, params["stop_loss"])
+    busy = False
+    day = None
+    for color, signal, today in zip(colors.tolist(), targets.tolist(), days.tolist()):
+        if today != day:
+            day = today
+            stopped[:] = False
+            session_start[:] = wallet
+        if busy:
+            active = level >= 0
+            amount = base * multiplier ** np.maximum(level, 0)
+            white_amount = np.where(protection, white_base * white_multiplier ** np.maximum(level, 0), 0.0)
+            won = target == color
+            if white and color == 0:
+                # the protection stake pays on white whether or not white was the target
+                result = white_amount * (WHITE_PAYOUT - 1) + np.where(won, amount * (WHITE_PAYOUT - 1), -amount)
+                hit = won | protection
+            else:
+                result = np.where(won, amount * (COLOR_PAYOUT - 1), -amount) - white_amount
+                hit = won
+            result = np.where(active, result, 0.0)
+            hit &= active
+            missed = active & ~hit
+            gale = missed & (level < params["martingale"])
+            counters["count_win"] += hit
+            counters["count_loss"] += missed & ~gale
+            counters["count_martingale"] += gale
+            level = np.where(gale, level + 1, np.where(active, -1, level))
+            wallet += result
+            profit += result
+            np.maximum(peak, profit, out=peak)
+            np.maximum(drawdown, peak - profit, out=drawdown)
+            session = wallet - session_start
+            stopped |= active & (level < 0) & ((session >= stop_gain) | (session <= -stop_loss))
+            busy = bool(gale.any())
+        if signal >= 0:
+            start = (level < 0) & ~stopped & (wallet > 0)
+            if start.any():
+                level[start] = 0
+                target[start] = signal
+                base[start] = np.where(params["percent"], wallet * params["enter_percent"] / 100,
+                                       params["enter_value"])[start]
+                white_base[start] = params["protection_value"][start]
+                busy = True
+    return dict(counters, profit=profit, max_drawdown=drawdown)
+
+
+def chunks(params, count):
+    size = len(params["martingale"])
+    bounds = np.linspace(0, size, count + 1).astype(int)
+    return [{key: values[start:end] for key, values in params.items()}
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+class Backtester(object):
+
+    def __init__(self, game, colors, created_at=None, balance=100.0):
+        self.game = game
+        self.colors = np.asarray(colors, dtype=np.int8)
+        created_at = np.zeros(len(self.colors), dtype=np.int64) if created_at is None else np.asarray(created_at)
+        self.days = created_at // 86400000
+        self.balance = balance
+
+    @classmethod
+    def from_store(cls, store, rounds=None, balance=100.0):
+        view = store.last(rounds)
+        return cls(store.game, view["color"], view["created_at"], balance)
+
+    def run(self, strategies, settings, workers=None):
+        settings = list(settings)
+        params = parameters(settings)
+        targets = signals(self.game, self.colors, strategies)
+        workers = workers or os.cpu_count() or 1
+        parts = chunks(params, min(workers, len(settings)))
+        white = self.game == "double"
+        if len(parts) == 1:
+            results = [simulate(self.colors, targets, self.days, parts[0], self.balance, white)]
+        else:
+            with ProcessPoolExecutor(max_workers=len(parts)) as executor:
+                futures = [executor.submit(simulate, self.colors, targets, self.days, part, self.balance, white)
+                           for part in parts]
+                results = [future.result() for future in futures]
+        merged = {key: np.concatenate([result[key] for result in results]) for key in COUNTERS}
+        return [dict(setting, **{key: merged[key][index].item() for key in COUNTERS})
+                for index, setting in enumerate(settings)]
@@ -0,0 +1,79 @@
+import sys
+import time
+import numpy as np
+from bot.backtest import Backtester, grid, parameters, signals
+
+STRATEGIES = [("V,V", "P"), ("P,P,P", "V"), ("V,P,V", "B")]
+
+
+def random_history(rounds, seed=0):
+    rolls = np.random.default_rng(seed).integers(0, 15, rounds)
+    colors = np.where(rolls == 0, 0, np.where(rolls <= 7, 1, 2))
+    return colors, np.arange(rounds, dtype=np.int64) * 30000
+
+
+def legacy_backtest(colors, targets, days, setting, balance=100.0):
+    params = {key: values[0] for key, values in parameters([setting]).items()}
+    multiplier = params["martingale_multiplier"]
+    white_multiplier = params["white_multiplier"] if params["white_martingale"] else 1.0
+    level, wallet, session_start, profit, peak, drawdown = -1, balance, balance, 0.0, 0.0, 0.0
+    stopped, day, wins, losses, gales = False, None, 0, 0, 0
+    for color, signal, today in zip(colors, targets, days):
+        if today != day:
+            day, stopped, session_start = today, False, wallet
+        if level >= 0:
+            amount = base * multiplier ** level
+            white_amount = white_base * white_multiplier ** level if params["protection"] else 0.0
+            won = target == color
+            if color == 0:
+                result = white_amount * 13 + (amount * 13 if won else -amount)
+                hit = won or params["protection"]
+            else:
+                result = (amount if won else -amount) - white_amount
+                hit = won
+            if hit:
+                wins, level = wins + 1, -1
+            elif level < params["martingale"]:
+                gales, level = gales + 1, level + 1
+            else:
+                losses, level = losses + 1, -1
+            wallet, profit = wallet + result, profit + result
+            peak = max(peak, profit)
+            drawdown = max(drawdown, peak - profit)
+            if level < 0 and (wallet - session_start >= params["stop_gain"] or
+                              wallet - session_start <= -params["stop_loss"]):
+                stopped = True
+        if signal >= 0 and level < 0 and not stopped and wallet > 0:
+            level, target, base, white_base = 0, signal, params["enter_value"], params["protection_value"]
+    return wins, losses, gales, profit, drawdown
+
+
+def main(rounds=100000, workers=None):
+    colors, created_at = random_history(rounds)
+    settings = grid(martingale=range(6), martingale_multiplier=[1.8, 2.0, 2.2, 2.5],
+                    protection_hand=["SIM", "NÃO"], white_martingale=["SIM", "NÃO"],
+                    protection_value=[0.5, 1.0, 2.0], enter_value=[1.0, 2.0, 5.0],
+                    stop_gain=[20, 50, 100], stop_loss=[30, 100])
+    backtester = Backtester("double", colors, created_at)
+    started = time.perf_counter()
+    results = backtester.run(STRATEGIES, settings, workers=workers)
+    vectorized = time.perf_counter() - started
+    targets = signals("double", backtester.colors, STRATEGIES).tolist()
+    sample = settings[:20]
+    started = time.perf_counter()
+    expected = [legacy_backtest(backtester.colors.tolist(), targets, backtester.days.tolist(), setting)
+                for setting in sample]
+    legacy = (time.perf_counter() - started) / len(sample) * len(settings)
+    assert [result[:3] for result in expected] == \
+           [(result["count_win"], result["count_loss"], result["count_martingale"]) for result in results[:20]]
+    assert np.allclose([result[3:] for result in expected],
+                       [(result["profit"], result["max_drawdown"]) for result in results[:20]])
+    best = max(results, key=lambda result: result["profit"])
+    print(f"rounds: {rounds}, combinations: {len(settings)}")
+    print(f"per combination loop (estimated): {legacy:.1f} s")
+    print(f"vectorized sweep:                 {vectorized:.1f} s ({legacy / vectorized:.0f}x)")
+    print(f"best profit: {best['profit']:.2f} (max drawdown {best['max_drawdown']:.2f})")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
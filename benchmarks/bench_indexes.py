@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import random
+import tempfile
+from sqlalchemy import create_engine, bindparam, text
+from bot.models import Base, User, Settings, Variables
+from bot.migrations import migrate
+
+LEGACY_INDEXES = {
+    "users": ("id", "user_bot", "name", "account_type", "game_type", "hashed_token", "token",
+              "process_pid", "wallet", "payment_id", "payment_expire_in", "payment_status",
+              "color_bet", "color_before", "point_bet", "point_before"),
+    "settings": ("id", "strategy_type", "enter_type", "enter_percent", "first_amount", "first_protection",
+                 "enter_value", "stop_type", "stop_gain", "stop_loss", "protection_hand", "protection_value",
+                 "martingale", "white_martingale", "martingale_multiplier", "white_multiplier",
+                 "quantity_cycles"),
+    "variables": ("id", "count_loss", "count_win", "count_martingale", "profit", "balance",
+                  "first_balance", "created", "is_gale"),
+    "strategies": ("id", "sequence", "color"),
+}
+
+
+def legacy_schema(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for table_name, columns in LEGACY_INDEXES.items():
+            for column in columns:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{column} "
+                                        f"ON {table_name} ({column})"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_users_active_betting"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_users_expire_in"))
+        for table_name in ("settings", "variables", "strategies"):
+            connection.execute(text(f"DROP INDEX IF EXISTS ix_{table_name}_owner_id"))
+
+
+def populate(engine, users):
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": index + 1, "user_bot": index, "email": f"user{index}@mail.com", "password": "secret",
+             "is_active": True, "is_betting": True} for index in range(users)])
+        connection.execute(Settings.__table__.insert(), [{"owner_id": index + 1} for index in range(users)])
+        connection.execute(Variables.__table__.insert(), [{"owner_id": index + 1} for index in range(users)])
+
+
+def play_rounds(engine, users, rounds):
+    variables = Variables.__table__
+    user_table = User.__table__
+    started = time.perf_counter()
+    for round_number in range(rounds):
+        with engine.begin() as connection:
+            connection.execute(
+                variables.update().where(variables.c.owner_id == bindparam("v_owner_id")).values(
+                    count_win=variables.c.count_win + 1, profit=bindparam("v_profit"),
+                    balance=bindparam("v_balance"), is_gale=bindparam("v_is_gale")),
+                [{"v_owner_id": index + 1, "v_profit": random.random() * 100,
+                  "v_balance": random.random() * 1000, "v_is_gale": random.random() > 0.5}
+                 for index in range(users)])
+            connection.execute(
+                user_table.update().where(user_table.c.id == bindparam("v_id")).values(
+                    color_bet=bindparam("v_color_bet"), color_before=bindparam("v_color_before")),
+                [{"v_id": index + 1, "v_color_bet": random.choice(("vermelho", "preto")),
+                  "v_color_before": random.choice(("vermelho", "preto", "branco"))} for index in range(users)])
+    elapsed = time.perf_counter() - started
+    return rounds * users / elapsed
+
+
+def main(users=2000, rounds=20):
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    legacy_schema(engine)
+    populate(engine, users)
+    before = play_rounds(engine, users, rounds)
+    changes = migrate(engine, verbose=False)
+    after = play_rounds(engine, users, rounds)
+    print(f"users: {users}, rounds: {rounds}")
+    print(f"migration: {len(changes)} index changes")
+    print(f"legacy schema:  {before:,.0f} user updates/s")
+    print(f"revised schema: {after:,.0f} user updates/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,61 @@
+import sys
+import time
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker, selectinload
+from bot.models import Base, User, Settings, Variables, Strategies, user_bundles, bundle_as_bytes
+
+
+def legacy_object_as_dict(obj):
+    return {c.key: getattr(obj, c.key)
+            for c in inspect(obj).mapper.column_attrs}
+
+
+def legacy_bundle(user):
+    return {"user": legacy_object_as_dict(user),
+            "settings": legacy_object_as_dict(user.settings[0]) if len(user.settings) > 0 else None,
+            "variables": legacy_object_as_dict(user.variables[0]) if len(user.variables) > 0 else None,
+            "strategies": [legacy_object_as_dict(strategy) for strategy in user.strategies]
+            if len(user.strategies) > 0 else None}
+
+
+def load_users(count, strategies=3):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for index in range(count):
+        user = User(user_bot=index, email=f"user{index}@mail.com", password="secret")
+        user.settings = [Settings()]
+        user.variables = [Variables()]
+        user.strategies = [Strategies(sequence="V,V,P", color="P") for _ in range(strategies)]
+        session.add(user)
+    session.commit()
+    session.expunge_all()
+    return session.query(User).options(selectinload(User.settings),
+                                        selectinload(User.variables),
+                                        selectinload(User.strategies)).all()
+
+
+def measure(func, users, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(users)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(count=10000):
+    users = load_users(count)
+    legacy = measure(lambda items: [legacy_bundle(user) for user in items], users)
+    compiled = measure(user_bundles, users)
+    wire = measure(lambda items: [bundle_as_bytes(bundle) for bundle in user_bundles(items)], users)
+    assert [legacy_bundle(user) for user in users[:10]] == user_bundles(users[:10])
+    print(f"users: {count}")
+    print(f"legacy object_as_dict: {legacy * 1000:.1f} ms")
+    print(f"compiled serializer:   {compiled * 1000:.1f} ms ({legacy / compiled:.1f}x)")
+    print(f"compiled + bytes:      {wire * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
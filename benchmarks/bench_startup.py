@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import subprocess
+from statistics import median
+
+MODULES = ("bot.api", "bot.controllers", "bot.runtime")
+PROBE = """
+import sys
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+event.listen(Pool, "connect", lambda *args: connections.append(1))
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+config = sys.modules.get("bot.config")
+print(elapsed, config.get_config.cache_info().currsize if config else 0, len(connections))
+"""
+TIMING_PROBE = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+
+def run(code):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+def measure(module, runs=5):
+    imports = []
+    processes = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        imports.append(float(run(TIMING_PROBE.format(module=module))[0]))
+        processes.append(time.perf_counter() - started)
+    _, configs, connections = run(PROBE.format(module=module))
+    return {"import": median(imports), "process": median(processes),
+            "config_loaded": int(configs) > 0, "connections": int(connections)}
+
+
+def main(runs=5, budget=None):
+    failed = False
+    for module in MODULES:
+        result = measure(module, runs)
+        print(f"{module}: import {result['import'] * 1000:.1f}ms, processo {result['process'] * 1000:.1f}ms, "
+              f"config lida: {result['config_loaded']}, conexões: {result['connections']}")
+        if result["config_loaded"] or result["connections"]:
+            print(f"{module}: importação com efeitos colaterais")
+            failed = True
+        if budget and result["import"] * 1000 > budget:
+            print(f"{module}: importação acima de {budget}ms")
+            failed = True
+    return not failed
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    sys.exit(0 if main(*map(int, arguments[:1]), *map(float, arguments[1:2])) else 1)
@@ -0,0 +1,55 @@
+import sys
+import time
+import random
+from collections import deque
+from bot.stats import RoundStats, WINDOWS
+
+
+def random_points(rounds, seed=0):
+    generator = random.Random(seed)
+    return [max(1.0, 0.99 / (1 - generator.random())) for _ in range(rounds)]
+
+
+def legacy_snapshot(points):
+    # what callers do today with the lists from get_last_crashs: rebuild every window
+    data = {}
+    for size in WINDOWS:
+        window = sorted(points[-size:])
+        data[size] = {"count": len(window),
+                      "below_2": sum(1 for point in window if point < 2) / len(window),
+                      "quantiles": {f"p{int(q * 100)}": window[min(int(q * len(window)), len(window) - 1)]
+                                    for q in (0.1, 0.25, 0.5, 0.75, 0.9)}}
+    return data
+
+
+def main(rounds=20000):
+    points = random_points(rounds)
+    history = deque(maxlen=max(WINDOWS))
+    started = time.perf_counter()
+    for point in points:
+        history.append(point)
+        legacy = legacy_snapshot(list(history))
+    legacy_time = time.perf_counter() - started
+    stats = RoundStats("crash")
+    started = time.perf_counter()
+    for point in points:
+        stats.push(0, point)
+    update_time = time.perf_counter() - started
+    stats = RoundStats("crash")
+    started = time.perf_counter()
+    for point in points:
+        stats.push(0, point)
+        snapshot = stats.snapshot()
+    streaming_time = time.perf_counter() - started
+    for size in WINDOWS:
+        assert abs(snapshot["windows"][size]["below_2"] - legacy[size]["below_2"]) < 1e-9
+        for name, value in legacy[size]["quantiles"].items():
+            assert abs(snapshot["windows"][size]["quantiles"][name] / value - 1) < 0.05
+    print(f"rounds: {rounds}, windows: {WINDOWS}")
+    print(f"recompute per round:  {legacy_time / rounds * 1e6:.1f} us")
+    print(f"streaming update:     {update_time / rounds * 1e6:.1f} us")
+    print(f"update + snapshot:    {streaming_time / rounds * 1e6:.1f} us ({legacy_time / streaming_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
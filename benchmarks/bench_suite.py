@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+from datetime import datetime
+from sqlalchemy import create_engine
+from bot.db.database import DBSession
+from bot.models import Base
+from bot.api import BlazeClientAPI
+from bot.controllers import UserController
+from bot.fake_blaze import FakeBlaze
+from bot.scheduler import parse_timestamp
+
+SIZES = (100, 1000, 10000)
+TIMING = {
+    "double": (("waiting", 1.0), ("rolling", 0.5), ("complete", 0.3)),
+    "crash": (("waiting", 0.6), ("graphing", 0.8), ("complete", 0.3)),
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def describe(values):
+    return {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+            "max": max(values) if values else None}
+
+
+def user_data(index, **user):
+    data = {"user": {"user_bot": index, "email": f"user{index}@mail.com", "password": "secret",
+                     "account_type": "DEMO", "game_type": "DOUBLE", "token": "token", "wallet": "1",
+                     "is_active": True, "process_pid": None, "is_betting": False,
+                     "color_bet": None, "color_before": None},
+            "strategies": [{"sequence": "V,V,P", "color": "P"}],
+            "variables": {"count_win": 0, "count_loss": 0, "profit": 0.0},
+            "settings": {"enter_value": 2.0, "protection_value": 1.0}}
+    data["user"].update(user)
+    return data
+
+
+def throughput(func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - started
+    return {"ops": len(items), "seconds": elapsed, "ops_per_second": len(items) / elapsed if elapsed else None}
+
+
+def bench_controllers(size):
+    directory = tempfile.mkdtemp(prefix="bench-suite-")
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    DBSession.configure(bind=engine)
+    controller = UserController()
+    controller.cache.clear()
+    users = [user_data(index) for index in range(size)]
+    results = {"create": throughput(controller.create, users)}
+    controller.cache.clear()
+    results["check_user_exists_cold"] = throughput(controller.check_user_exists, range(size))
+    results["check_user_exists_warm"] = throughput(controller.check_user_exists, range(size))
+    results["read"] = throughput(lambda _: controller.read(), range(3))
+    results["enable"] = throughput(controller.enable, users)
+    disabled = [user_data(index, is_active=False) for index in range(size)]
+    results["disable"] = throughput(controller.disable, disabled)
+    controller.counters.flush()
+    engine.dispose()
+    return results
+
+
+async def wait_for_status(client, game, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = await client.async_get_current(game)
+        if response and response.json()["status"] == status:
+            return response.json()
+        await asyncio.sleep(0.02)
+    return None
+
+
+async def bench_rounds(rounds=10, latency=0.005):
+    server = FakeBlaze(rounds=100, latency=latency, timing=TIMING)
+    url = await server.start()
+    client = BlazeClientAPI()
+    client.url_base = client.url_server = url
+    client.token = "token"
+    client.wallet_id = 1
+    lags = []
+    bets = []
+    accepted = 0
+    scheduler = client.get_scheduler("double")
+    # measure the steady state, not the first rounds spent learning the shortened phases
+    scheduler.durations.update(TIMING["double"])
+    try:
+        await client.get_double(timeout=10)
+        scheduler.requests = 0
+        scheduler.rounds.clear()
+        for _ in range(rounds):
+            data = await client.awaiting_double(verbose=False, timeout=10)
+            if not data:
+                continue
+            detected_at = time.time()
+            lags.append(detected_at - parse_timestamp(data["updated_at"]))
+            if await wait_for_status(client, "double", "waiting"):
+                started = time.perf_counter()
+                result = await client.async_double_bets("vermelho", 2)
+                bets.append(time.perf_counter() - started)
+                accepted += bool(result["result"])
+        requests = list(scheduler.rounds)
+    finally:
+        await client.close()
+        await server.stop()
+    return {"rounds": rounds, "server_latency": latency,
+            "requests_per_round": sum(requests) / len(requests) if requests else None,
+            "detection_lag": describe(lags),
+            "bet_latency": describe(bets),
+            "bets_accepted": accepted}
+
+
+def compare(current, baseline, path=()):
+    for key, value in current.items():
+        previous = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, previous or {}, path + (key,))
+        elif isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            print(f"{'.'.join(map(str, path + (key,)))}: {previous:.4g} -> {value:.4g} "
+                  f"({(value - previous) / previous * 100:+.1f}%)")
+
+
+def main(output=None, baseline=None, sizes=SIZES, rounds=10):
+    results = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+               "rounds": asyncio.run(bench_rounds(rounds)),
+               "controllers": {}}
+    print(f"polling: {results['rounds']['requests_per_round']} requests/round, "
+          f"detection lag p50 {results['rounds']['detection_lag']['p50']}, "
+          f"bet latency p50 {results['rounds']['bet_latency']['p50']}")
+    for size in sizes:
+        results["controllers"][str(size)] = bench_controllers(size)
+        print(f"users: {size} " + ", ".join(f"{name} {values['ops_per_second']:.0f}/s"
+                                           for name, values in results["controllers"][str(size)].items()))
+    output = output or f"bench_suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"resultados salvos em {output}")
+    if baseline:
+        with open(baseline, encoding="utf-8") as baseline_file:
+            compare(results, json.load(baseline_file))
+    return results
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    main(*arguments[:2], sizes=tuple(map(int, arguments[2:])) or SIZES)
@@ -0,0 +1,16 @@
+import configparser
+from functools import lru_cache
+
+CONFIG_PATH = "settings/config.ini"
+
+
+@lru_cache(maxsize=None)
+def get_config(path=CONFIG_PATH):
+    config = configparser.ConfigParser()
+    config.read(path, encoding="utf-8")
+    return config
+
+
+def server_url():
+    config = get_config()
+    return f"http://{config.get('server', 'host')}:{config.getint('server', 'port')}"
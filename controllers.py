@@ -1,21 +1,39 @@
 import hashlib
-import configparser
 from datetime import datetime, date, timedelta
 from contextlib import contextmanager
-from bot.utils.messages import info_message, trial_message
-from bot.models import Base, User, Settings, Variables, Strategies
-from bot.db.database import DBSession, engine
+from sqlalchemy.orm import selectinload
+from bot.models import User, Settings, Variables, Strategies, user_bundle, user_bundles, copy_bundle
+from bot.db.database import DBSession
+from bot.counters import variables_store
+from bot.cache import TTLCache
+from bot.outbox import enqueue
+from bot.metrics import metrics
+from bot.config import get_config
 
-# Base.metadata.drop_all(engine)
-Base.metadata.create_all(bind=engine)
-config = configparser.ConfigParser()
-config.read('settings/config.ini', encoding="utf-8")
 
-secret_key = config.get("settings", "secret_key")
+def get_secret_key():
+    return get_config().get("settings", "secret_key")
+
+
+def shard_count():
+    return get_config().getint("runtime", "shards", fallback=4)
+
+
+LAZY_SETTINGS = {"config": get_config, "secret_key": get_secret_key, "shards": shard_count}
+
+
+def __getattr__(name):
+    if name in LAZY_SETTINGS:
+        return LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def generate_hashed_token(bot_id):
-    return hashlib.md5(secret_key.encode() + bot_id.encode()).hexdigest()
+    return hashlib.md5(get_secret_key().encode() + bot_id.encode()).hexdigest()
+
+
+def shard_for(user_bot, count=None):
+    return int(user_bot) % (count or shard_count())
 
 
 def check_hashed_token(bot_id, hashed_token):
@@ -49,50 +67,142 @@ class UserController(object):
     settings = Settings
     variables = Variables
     strategies = Strategies
+    counters = variables_store
+    cache = TTLCache(maxsize=4096, ttl=30)
+    matchers = None
+
+    def __init__(self, unit_of_work=True):
+        self.unit_of_work = unit_of_work
+
+    def run(self, operation, func, *args, **kwargs):
+        released = {}
+        try:
+            with metrics.operation(operation), session_scope() as session:
+                session.info["released_counters"] = released
+                result = func(session, *args, **kwargs)
+                changed = session.info.pop("changed_users", ())
+                strategies = session.info.pop("changed_strategies", ())
+        except:
+            self.restore_counters(released)
+            raise
+        # only touch the cache and matchers once the transaction is committed
+        self.invalidate(*changed)
+        self.refresh_matcher(*strategies)
+        return result
+
+    def changed(self, session, *bot_ids, strategies=True):
+        bot_ids = [int(bot_id) for bot_id in bot_ids if bot_id is not None]
+        session.info.setdefault("changed_users", set()).update(bot_ids)
+        if strategies:
+            session.info.setdefault("changed_strategies", set()).update(bot_ids)
+
+    def release_counters(self, session, owner_id):
+        values = self.counters.pop(owner_id)
+        if values is not None:
+            session.info.setdefault("released_counters", {})[owner_id] = values
+        return values
+
+    def restore_counters(self, released):
+        # a rolled back write never stored the released values, hand them back to the flusher
+        for owner_id, values in released.items():
+            self.counters.restore(owner_id, values)
 
     def create(self, data):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
-            if not user:
-                check_email_in_use = session.query(self.model).filter_by(email=data["user"]["email"]).first()
-                if check_email_in_use:
-                    print("Email já está em uso...")
-                    return {"result": False, "message": "Email já está em uso..."}
-                user = self.model()
-                user.user_bot = int(data["user"]["user_bot"])
-                user.email = data["user"]["email"]
-                user.name = data["user"].get("name")
-                user.password = data["user"]["password"]
-                user.account_type = data["user"]["account_type"]
-                user.game_type = data["user"]["game_type"]
-                user.token = data["user"]["token"]
-                user.wallet = data["user"]["wallet"]
-                self.save(session, user, refresh=True)
-                if data.get("strategies"):
-                    self.create_user_strategies(session, data, user.id)
-                self.create_user_variables(session, data, user.id)
-                self.create_user_settings(session, data, user.id)
-            else:
-                self.update(session, data, user)
-            return {"user": user.as_dict(),
-                    "settings": user.settings[0].as_dict(),
-                    "variables": user.variables[0].as_dict(),
-                    "strategies": [strategy.as_dict() for strategy in user.strategies]
-                    }
+        return self.run("create", self.apply_create, data)
+
+    def apply_create(self, session, data):
+        user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
+        if not user:
+            check_email_in_use = session.query(self.model).filter_by(email=data["user"]["email"]).first()
+            if check_email_in_use:
+                print("Email já está em uso...")
+                return {"result": False, "message": "Email já está em uso..."}
+            user = self.model()
+            user.user_bot = int(data["user"]["user_bot"])
+            user.email = data["user"]["email"]
+            user.name = data["user"].get("name")
+            user.password = data["user"]["password"]
+            user.account_type = data["user"]["account_type"]
+            user.game_type = data["user"]["game_type"]
+            user.token = data["user"]["token"]
+            user.wallet = data["user"]["wallet"]
+            self.save(session, user, refresh=True)
+            if data.get("strategies"):
+                self.create_user_strategies(session, data, user.id)
+            self.create_user_variables(session, data, user.id)
+            self.create_user_settings(session, data, user.id)
+        else:
+            self.invalidate(user.user_bot)
+            self.update(session, data, user)
+        self.changed(session, user.user_bot)
+        return self.serialize(user)
 
     def check_user_exists(self, bot_id):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=bot_id).first()
-            if not user:
-                return False
-            elif user.expire_in and datetime.now() > user.expire_in:
-                return self.change_token_status(user.id)
-            return {"user": user.as_dict(),
-                    "settings": user.settings[0].as_dict() if len(user.settings) > 0 else None,
-                    "variables": user.variables[0].as_dict() if len(user.variables) > 0 else None,
-                    "strategies": [strategy.as_dict() for strategy in user.strategies]
-                    if len(user.strategies) > 0 else None
-                    }
+        with metrics.operation("check_user_exists"):
+            key = int(bot_id)
+            bundle = self.cache.get(key)
+            metrics.increment("controller_cache_total", operation="check_user_exists",
+                              result="miss" if bundle is None else "hit")
+            if bundle is not None and self.is_expired(bundle):
+                # another process may have handled the expiry already, only the database knows
+                self.cache.invalidate(key)
+                bundle = None
+            if bundle is None:
+                with session_scope() as session:
+                    bundle = self.load_bundle(session, bot_id)
+                if not bundle:
+                    return False
+                self.cache.set(key, bundle)
+            if self.is_expired(bundle):
+                return self.expire(bundle["user"]["id"])
+            return self.overlay_variables(copy_bundle(bundle))
+
+    def load_bundle(self, session, bot_id):
+        user = session.query(self.model).filter_by(user_bot=bot_id).first()
+        if not user:
+            return False
+        return self.serialize(user)
+
+    @staticmethod
+    def is_expired(bundle):
+        expire_in = bundle["user"]["expire_in"]
+        return bool(expire_in and datetime.now() > expire_in)
+
+    def invalidate(self, *bot_ids):
+        for bot_id in bot_ids:
+            if bot_id is not None:
+                self.cache.invalidate(int(bot_id))
+
+    def load_matchers(self):
+        if self.matchers is None:
+            return 0
+        with metrics.operation("load_matchers"), session_scope() as session:
+            return self.apply_load_matchers(session)
+
+    def apply_load_matchers(self, session):
+        return self.matchers.load(session, self.model)
+
+    def refresh_matcher(self, *bot_ids):
+        bot_ids = [int(bot_id) for bot_id in bot_ids if bot_id is not None]
+        if self.matchers is None or not bot_ids:
+            return
+        with metrics.operation("refresh_matcher"), session_scope() as session:
+            self.apply_refresh_matcher(session, bot_ids)
+
+    def apply_refresh_matcher(self, session, bot_ids):
+        users = session.query(self.model).options(selectinload(self.model.strategies)) \
+            .filter(self.model.user_bot.in_(bot_ids)).all()
+        for user in users:
+            self.matchers.set_user(user.id, user.game_type, user.strategies if user.is_active else [])
+
+    def overlay_variables(self, bundle):
+        values = self.counters.get(bundle["user"]["id"])
+        if values and bundle["variables"] is not None:
+            bundle["variables"].update(values)
+        return bundle
+
+    def update_variables(self, owner_id, **values):
+        return self.counters.update(owner_id, **values)
 
     def create_user_settings(self, session, data, user_id=None):
         if not user_id:
@@ -100,6 +210,7 @@ class UserController(object):
         user_settings = session.query(self.settings).filter_by(owner_id=user_id).first()
         if not user_settings:
             user_settings = self.settings(**data["settings"], owner_id=user_id)
+            self.expire_relation(session, user_id, "settings")
         else:
             user_settings.strategy_type = data["settings"].get("strategy_type")
             user_settings.enter_type = data["settings"].get("enter_type")
@@ -116,7 +227,7 @@ class UserController(object):
             user_settings.martingale_multiplier = data["settings"].get("martingale_multiplier")
             user_settings.white_multiplier = data["settings"].get("white_multiplier")
             user_settings.quantity_cycles = data["settings"].get("quantity_cycles")
-        self.save(session, user_settings, refresh=True)
+        self.save(session, user_settings)
         return user_settings
 
     def create_user_variables(self, session, data, user_id=None):
@@ -125,6 +236,7 @@ class UserController(object):
         user_variables = session.query(self.variables).filter_by(owner_id=user_id).first()
         if not user_variables:
             user_variables = self.variables(**data["variables"], owner_id=user_id)
+            self.expire_relation(session, user_id, "variables")
         else:
             user_variables.count_loss = data["variables"].get("count_loss")
             user_variables.count_win = data["variables"].get("count_win")
@@ -134,7 +246,7 @@ class UserController(object):
             user_variables.first_balance = data["variables"].get("first_balance")
             user_variables.created = data["variables"].get("created")
             user_variables.is_gale = data["variables"].get("is_gale")
-        self.save(session, user_variables, refresh=True)
+        self.save(session, user_variables)
         return user_variables
 
     def create_user_strategies(self, session, data, user_id=None):
@@ -142,6 +254,8 @@ class UserController(object):
         if not user_id:
             user_id = data["user"]["id"]
         if data["strategies"] and len(data["strategies"]) > 0:
+            if self.unit_of_work:
+                return self.save_user_strategies(session, data["strategies"], user_id)
             for index, strategy in enumerate(data["strategies"]):
                 if not strategy.get("id"):
                     user_strategies = self.strategies(**strategy, owner_id=user_id)
@@ -151,18 +265,71 @@ class UserController(object):
                     if user_strategies:
                         user_strategies.sequence = strategy["sequence"]
                         user_strategies.color = strategy["color"]
-                self.save(session, user_strategies, refresh=True)
+                self.save(session, user_strategies)
         return user_strategies
 
-    def read(self):
-        with session_scope() as session:
-            users = session.query(self.model).all()
-            if len(users) > 0:
-                return [{"user": user.as_dict(),
-                         "settings": user.settings[0].as_dict() if len(user.settings) > 0 else None,
-                         "variables": user.variables[0].as_dict() if len(user.variables) > 0 else None,
-                         "strategies": [strategy.as_dict() for strategy in user.strategies]
-                         if len(user.strategies) > 0 else None} for index, user in enumerate(users)][::-1]
+    def save_user_strategies(self, session, strategies, user_id):
+        changes = {strategy["id"]: strategy for strategy in strategies if strategy.get("id")}
+        user_strategies = []
+        if changes:
+            user_strategies = session.query(self.strategies).filter(self.strategies.owner_id == user_id,
+                                                                    self.strategies.id.in_(changes)).all()
+            for user_strategy in user_strategies:
+                user_strategy.sequence = changes[user_strategy.id]["sequence"]
+                user_strategy.color = changes[user_strategy.id]["color"]
+        new_strategies = [self.strategies(**{key: value for key, value in strategy.items() if key != "id"},
+                                          owner_id=user_id)
+                          for strategy in strategies if not strategy.get("id")]
+        if new_strategies:
+            session.add_all(new_strategies)
+            self.expire_relation(session, user_id, "strategies")
+        return user_strategies + new_strategies
+
+    def expire_relation(self, session, user_id, relation):
+        if not self.unit_of_work:
+            return
+        user = session.get(self.model, user_id)
+        if user is not None:
+            session.expire(user, [relation])
+
+    @staticmethod
+    def serialize(user):
+        return user_bundle(user)
+
+    def query_users(self, session, before_id=None, active=None, game_type=None, payment_status=None):
+        query = session.query(self.model).options(selectinload(self.model.settings),
+                                                  selectinload(self.model.variables),
+                                                  selectinload(self.model.strategies))
+        if before_id is not None:
+            query = query.filter(self.model.id < before_id)
+        if active is not None:
+            query = query.filter(self.model.is_active == active)
+        if game_type is not None:
+            query = query.filter(self.model.game_type == game_type)
+        if payment_status is not None:
+            query = query.filter(self.model.payment_status == payment_status)
+        return query.order_by(self.model.id.desc())
+
+    def read(self, limit=None, before_id=None, active=None, game_type=None, payment_status=None):
+        return self.run("read", self.read_users, limit, before_id, active, game_type, payment_status)
+
+    def read_users(self, session, limit=None, before_id=None, active=None, game_type=None, payment_status=None):
+        query = self.query_users(session, before_id, active, game_type, payment_status)
+        if limit:
+            query = query.limit(limit)
+        users = query.all()
+        if len(users) > 0:
+            return user_bundles(users)
+
+    def iter_users(self, batch_size=500, active=None, game_type=None, payment_status=None):
+        before_id = None
+        while True:
+            page = self.read(batch_size, before_id, active, game_type, payment_status) or []
+            for bundle in page:
+                yield bundle
+            if len(page) < batch_size:
+                return
+            before_id = page[-1]["user"]["id"]
 
     def update(self, session, data, user):
         check_email_in_use = session.query(self.model).filter_by(email=data["user"]["email"]).first()
@@ -186,149 +353,186 @@ class UserController(object):
         user.payment_status = data["user"].get("payment_status")
         user.payment_expire_in = data["user"].get("payment_expire_in")
         if not check_email_in_use:
-            self.save(session, user, refresh=True)
+            self.save(session, user)
         if data.get("strategies"):
             self.create_user_strategies(session, data)
         self.create_user_variables(session, data)
         self.create_user_settings(session, data)
 
     def enable(self, data):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
-            if user:
-                user.is_active = data["user"]["is_active"]
-                user.process_pid = data["user"]["process_pid"]
-                user.settings[0].first_amount = data["settings"].get("enter_value")
-                user.settings[0].first_protection = data["settings"].get("protection_value")
-                self.create_user_strategies(session, data, user.id)
-                self.create_user_settings(session, data, user.id)
-                self.create_user_variables(session, data, user.id)
-                self.save(session, user, refresh=True)
+        return self.run("enable", self.apply_enable, data)
+
+    def apply_enable(self, session, data):
+        user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
+        if user:
+            self.release_counters(session, user.id)
+            user.is_active = data["user"]["is_active"]
+            user.process_pid = data["user"].get("process_pid")
+            user.shard_id = shard_for(user.user_bot)
+            user.settings[0].first_amount = data["settings"].get("enter_value")
+            user.settings[0].first_protection = data["settings"].get("protection_value")
+            self.create_user_strategies(session, data, user.id)
+            self.create_user_settings(session, data, user.id)
+            self.create_user_variables(session, data, user.id)
+            self.save(session, user)
+        self.changed(session, data["user"]["user_bot"])
 
     def change_bets_status(self, data):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
-            if user:
-                user.is_betting = data["user"]["is_betting"]
-                self.save(session, user)
+        return self.run("change_bets_status", self.apply_bets_status, data)
+
+    def apply_bets_status(self, session, data):
+        user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
+        if user:
+            user.is_betting = data["user"]["is_betting"]
+            self.save(session, user)
+        self.changed(session, data["user"]["user_bot"], strategies=False)
 
     def change_payment_status(self, data):
-        with session_scope() as session:
-            if data["user"].get("email"):
-                user = session.query(self.model).filter_by(email=data["user"]["email"]).first()
-                if user:
-                    user.payment_status = data["user"]["payment_status"]
-                    self.save(session, user)
-            else:
-                user = session.query(self.model).filter_by(payment_id=data["user"]["payment_id"]).first()
-                hashed_token = generate_hashed_token(str(user.user_bot)) if user.payment_status != "PAID" else None
+        return self.run("change_payment_status", self.apply_payment_status, data)
+
+    def apply_payment_status(self, session, data):
+        if data["user"].get("email"):
+            user = session.query(self.model).filter_by(email=data["user"]["email"]).first()
+            if user:
                 user.payment_status = data["user"]["payment_status"]
-                if user.payment_status == "PAID" and user.payment_expire_in:
-                    set_expiration_date(user, **{"days": int(user.payment_expire_in)})
-                info_message(user, hashed_token)
-                user.payment_id = None
-                user.payment_expire_in = None
-                user.is_testing = False
-            self.save(session, user)
+                self.save(session, user)
+        else:
+            user = session.query(self.model).filter_by(payment_id=data["user"]["payment_id"]).first()
+            hashed_token = generate_hashed_token(str(user.user_bot)) if user.payment_status != "PAID" else None
+            user.payment_status = data["user"]["payment_status"]
+            if user.payment_status == "PAID" and user.payment_expire_in:
+                set_expiration_date(user, **{"days": int(user.payment_expire_in)})
+            enqueue(session, "info", user, hashed_token=hashed_token)
+            user.payment_id = None
+            user.payment_expire_in = None
+            user.is_testing = False
+        self.save(session, user)
+        self.changed(session, user.user_bot if user else None, strategies=False)
 
     def create_trial_access(self, data, **kwargs):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
-            if user:
-                user.already_tested = True
-                user.is_testing = True
-                user.hashed_token = generate_hashed_token(str(user.user_bot))
-                set_expiration_date(user, **kwargs)
-                trial_message(user, kwargs)
-            self.save(session, user)
-            return {"user": user.as_dict(),
-                    "settings": user.settings[0].as_dict() if len(user.settings) > 0 else None,
-                    "variables": user.variables[0].as_dict() if len(user.variables) > 0 else None,
-                    "strategies": [strategy.as_dict() for strategy in user.strategies]
-                    if len(user.strategies) > 0 else None
-                    }
+        return self.run("create_trial_access", self.apply_trial_access, data, **kwargs)
+
+    def apply_trial_access(self, session, data, **kwargs):
+        user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
+        if user:
+            user.already_tested = True
+            user.is_testing = True
+            user.hashed_token = generate_hashed_token(str(user.user_bot))
+            set_expiration_date(user, **kwargs)
+            enqueue(session, "trial", user, kwargs=kwargs)
+        self.save(session, user)
+        self.changed(session, data["user"]["user_bot"], strategies=False)
+        return self.serialize(user)
 
     def change_token_status(self, uid, client_id=None, days=None):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(id=int(uid)).first()
-            if client_id:
-                user = session.query(self.model).filter_by(user_bot=int(client_id)).first()
-            if user:
-                hashed_token = generate_hashed_token(str(user.user_bot)) \
-                    if user.payment_status != "PAID" and not user.is_testing else None
-                user.payment_status = "PAID" if user.payment_status != "PAID" and not user.is_testing else "PENDING"
+        return self.run("change_token_status", self.apply_token_status, uid, client_id, days)
+
+    def apply_token_status(self, session, uid, client_id=None, days=None):
+        user = session.query(self.model).filter_by(id=int(uid)).first()
+        if client_id:
+            user = session.query(self.model).filter_by(user_bot=int(client_id)).first()
+        if user:
+            hashed_token = generate_hashed_token(str(user.user_bot)) \
+                if user.payment_status != "PAID" and not user.is_testing else None
+            user.payment_status = "PAID" if user.payment_status != "PAID" and not user.is_testing else "PENDING"
+            if user.already_tested:
+                user.is_testing = False
+            if user.is_active:
+                user.is_active = False
+                user.is_betting = False
+            if not hashed_token:
+                user.hashed_token = hashed_token
+                data = self.serialize(user)
+                if data:
+                    self.apply_disable(session, data)
+            if user.payment_status == "PAID" and days:
+                set_expiration_date(user, **{"days": int(days)})
+            else:
+                user.created_at = None
+                user.expire_in = None
                 if user.already_tested:
                     user.is_testing = False
-                if user.is_active:
-                    user.is_active = False
-                    user.is_betting = False
-                if not hashed_token:
-                    user.hashed_token = hashed_token
-                    data = {"user": user.as_dict(),
-                            "settings": user.settings[0].as_dict() if len(user.settings) > 0 else None,
-                            "variables": user.variables[0].as_dict() if len(user.variables) > 0 else None,
-                            "strategies": [strategy.as_dict() for strategy in user.strategies]
-                            if len(user.strategies) > 0 else None
-                            }
-                    if data:
-                        self.disable(data)
-                if user.payment_status == "PAID" and days:
-                    set_expiration_date(user, **{"days": int(days)})
-                else:
-                    user.created_at = None
-                    user.expire_in = None
-                    if user.already_tested:
-                        user.is_testing = False
-                info_message(user, hashed_token)
-                self.save(session, user)
-            return {"user": user.as_dict(),
-                    "settings": user.settings[0].as_dict() if len(user.settings) > 0 else None,
-                    "variables": user.variables[0].as_dict() if len(user.variables) > 0 else None,
-                    "strategies": [strategy.as_dict() for strategy in user.strategies]
-                    if len(user.strategies) > 0 else None
-                    }
+            enqueue(session, "info", user, hashed_token=hashed_token)
+            self.save(session, user)
+        bundle = self.serialize(user)
+        self.changed(session, bundle["user"]["user_bot"])
+        return bundle
+
+    def expire(self, uid, now=None):
+        return self.run("expire", self.apply_expire, uid, now)
+
+    def apply_expire(self, session, uid, now=None):
+        user = session.query(self.model).filter_by(id=int(uid)).with_for_update().first()
+        if not user:
+            return False
+        if not user.expire_in or user.expire_in > (now or datetime.now()):
+            return self.serialize(user)
+        return self.apply_token_status(session, user.id)
 
     def disable(self, data):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
-            if user:
-                user.is_active = data["user"]["is_active"]
-                user.is_betting = data["user"]["is_betting"]
-                user.color_bet = data["user"]["color_bet"]
-                user.color_before = data["user"]["color_before"]
-                self.create_user_strategies(session, data, user.id)
-                self.create_user_settings(session, data, user.id)
-                self.create_user_variables(session, data, user.id)
-                self.save(session, user)
+        self.run("disable", self.apply_disable, data)
+
+    def apply_disable(self, session, data):
+        user = session.query(self.model).filter_by(user_bot=data["user"]["user_bot"]).first()
+        if user:
+            values = self.release_counters(session, user.id)
+            if values:
+                data = dict(data, variables=dict(data.get("variables") or {}, **values))
+            user.is_active = data["user"]["is_active"]
+            user.is_betting = data["user"]["is_betting"]
+            user.color_bet = data["user"]["color_bet"]
+            user.color_before = data["user"]["color_before"]
+            self.create_user_strategies(session, data, user.id)
+            self.create_user_settings(session, data, user.id)
+            self.create_user_variables(session, data, user.id)
+            self.save(session, user)
+        self.changed(session, data["user"]["user_bot"])
+        return user
 
     def delete(self, uid):
-        with session_scope() as session:
-            user = session.query(self.model).filter_by(id=int(uid)).first()
-            if user:
-                self.save(session, user, delete=True)
+        self.run("delete", self.apply_delete, uid)
         return self.read()
 
+    def apply_delete(self, session, uid):
+        user = session.query(self.model).filter_by(id=int(uid)).first()
+        if user:
+            self.save(session, user, delete=True)
+            self.changed(session, user.user_bot, strategies=False)
+        if self.matchers is not None:
+            self.matchers.remove_user(int(uid))
+
     def delete_all_trial(self):
-        with session_scope() as session:
-            session.query(self.model).filter_by(hashed_token=None).delete()
-            session.commit()
+        self.run("delete_all_trial", self.apply_delete_all_trial)
+        self.cache.clear()
+        self.load_matchers()
         return self.read()
 
+    def apply_delete_all_trial(self, session):
+        session.query(self.model).filter_by(hashed_token=None).delete()
+
     def delete_strategies(self, data, index):
-        with session_scope() as session:
-            user_strategy = session.query(self.strategies).filter_by(id=data["strategies"][index]["id"],
-                                                                     owner_id=data["user"]["id"]
-                                                                     ).first()
+        self.run("delete_strategies", self.apply_delete_strategies, data, index)
+
+    def apply_delete_strategies(self, session, data, index):
+        user_strategy = session.query(self.strategies).filter_by(id=data["strategies"][index]["id"],
+                                                                 owner_id=data["user"]["id"]
+                                                                 ).first()
         if user_strategy:
             self.save(session, user_strategy, delete=True)
+        self.changed(session, data["user"].get("user_bot"))
 
-    @staticmethod
-    def save(session, object_model, delete=False, refresh=False):
+    def save(self, session, object_model, delete=False, refresh=False):
         try:
             if delete:
                 session.delete(object_model)
             else:
                 session.add(object_model)
+            if self.unit_of_work:
+                # the surrounding session_scope commits once; flush only when
+                # the caller needs database generated values such as the id
+                if refresh:
+                    session.flush()
+                return
             session.flush()
             session.commit()
             if refresh:
@@ -0,0 +1,158 @@
+import atexit
+import threading
+from sqlalchemy import bindparam
+from bot.models import Variables
+from bot.db.database import DBSession
+
+FIELDS = ("count_loss", "count_win", "count_martingale", "profit",
+          "balance", "first_balance", "created", "is_gale")
+
+
+class VariablesStore(object):
+
+    def __init__(self, flush_interval=5.0, max_dirty=200, session_factory=DBSession):
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.session_factory = session_factory
+        self.values = {}
+        self.dirty = {}
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.registered = False
+        self.flushes = 0
+        self.rows_written = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.stopped.clear()
+                self.thread = threading.Thread(target=self.run, name="variables-flusher", daemon=True)
+                self.thread.start()
+                if not self.registered:
+                    atexit.register(self.close)
+                    self.registered = True
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar variáveis: {e}")
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        thread, self.thread = self.thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def load(self, owner_id, values):
+        with self.lock:
+            if owner_id not in self.values:
+                self.values[owner_id] = {field: values.get(field) for field in FIELDS}
+            return dict(self.values[owner_id])
+
+    def get(self, owner_id):
+        with self.lock:
+            values = self.values.get(owner_id)
+            return dict(values) if values is not None else None
+
+    def update(self, owner_id, **values):
+        unknown = set(values) - set(FIELDS)
+        if unknown:
+            raise KeyError(f"Campos desconhecidos: {', '.join(sorted(unknown))}")
+        with self.lock:
+            current = self.values.setdefault(owner_id, {})
+            current.update(values)
+            self.dirty.setdefault(owner_id, set()).update(values)
+            pending = len(self.dirty)
+        if self.thread is None:
+            self.start()
+        if pending >= self.max_dirty:
+            self.wake.set()
+        return self.get(owner_id)
+
+    def increment(self, owner_id, field, delta=1):
+        with self.lock:
+            current = self.values.get(owner_id)
+            if current is None or field not in current:
+                current = self.load(owner_id, self.read(owner_id))
+            return self.update(owner_id, **{field: (current.get(field) or 0) + delta})
+
+    def read(self, owner_id):
+        session = self.session_factory()
+        try:
+            variables = session.query(Variables).filter_by(owner_id=owner_id).first()
+            return variables.as_dict() if variables else {}
+        finally:
+            session.close()
+
+    def pop(self, owner_id):
+        with self.flush_lock, self.lock:
+            self.dirty.pop(owner_id, None)
+            return self.values.pop(owner_id, None)
+
+    def restore(self, owner_id, values):
+        with self.lock:
+            # updates made after the pop are newer than the restored values
+            self.values[owner_id] = dict(values, **self.values.get(owner_id, {}))
+            self.dirty.setdefault(owner_id, set()).update(values)
+        if self.thread is None:
+            self.start()
+
+    def take_dirty(self, owner_ids=None):
+        with self.lock:
+            owner_ids = list(self.dirty) if owner_ids is None else [i for i in owner_ids if i in self.dirty]
+            return {owner_id: {field: self.values[owner_id][field] for field in self.dirty.pop(owner_id)}
+                    for owner_id in owner_ids}
+
+    def restore_dirty(self, pending):
+        with self.lock:
+            for owner_id, values in pending.items():
+                if owner_id in self.values:
+                    self.dirty.setdefault(owner_id, set()).update(values)
+
+    def flush(self, owner_ids=None):
+        with self.flush_lock:
+            pending = self.take_dirty(owner_ids)
+            if not pending:
+                return 0
+            groups = {}
+            for owner_id, values in pending.items():
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    dict({f"v_{field}": value for field, value in values.items()}, v_owner_id=owner_id))
+            session = self.session_factory()
+            try:
+                table = Variables.__table__
+                for fields, rows in groups.items():
+                    statement = table.update().where(table.c.owner_id == bindparam("v_owner_id")) \
+                        .values({field: bindparam(f"v_{field}") for field in fields})
+                    session.execute(statement, rows)
+                session.commit()
+            except:
+                session.rollback()
+                self.restore_dirty(pending)
+                raise
+            finally:
+                session.close()
+            self.flushes += 1
+            self.rows_written += len(pending)
+            return len(pending)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "users": len(self.values),
+                "dirty": len(self.dirty),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written
+            }
+
+
+variables_store = VariablesStore()
@@ -0,0 +1,122 @@
+import time
+import asyncio
+from bot.api import BlazeClientAPI
+from bot.transport import AsyncTransport
+
+
+class BetDispatcher(object):
+
+    def __init__(self, max_concurrency=20, transport=None, schedulers=None):
+        self.max_concurrency = max_concurrency
+        self.transport = transport or AsyncTransport(limit=max_concurrency)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.schedulers = schedulers if schedulers is not None else {}
+        self.clients = {}
+        self.last_duration = None
+
+    def use_scheduler(self, game, scheduler):
+        # dispatcher clients never poll, the betting window comes from a shared poller's scheduler
+        if scheduler is None:
+            self.schedulers.pop(game, None)
+        else:
+            self.schedulers[game] = scheduler
+
+    def betting_time_left(self, game):
+        scheduler = self.schedulers.get(game)
+        return scheduler.time_left() if scheduler is not None else None
+
+    def register(self, account, token, wallet_id, proxies=None):
+        client = self.clients.get(account)
+        if client is None:
+            client = self.clients[account] = BlazeClientAPI(transport=self.transport)
+            client.schedulers = self.schedulers
+        client.authorization(token)
+        client.wallet_id = wallet_id
+        client.proxies = proxies
+        return client
+
+    def unregister(self, account):
+        return self.clients.pop(account, None)
+
+    @staticmethod
+    def error_result(error):
+        return {
+            "result": False,
+            "object": {"error": error},
+            "message": "Erro, aposta não concluída!!!"
+        }
+
+    def prepare(self, bets, game="double"):
+        prepared = {}
+        errors = {}
+        for bet in bets:
+            account = bet.get("account")
+            if account in errors:
+                continue
+            if account in prepared:
+                # neither bet is sent, the caller could not tell which one the result belongs to
+                del prepared[account]
+                errors[account] = self.error_result(f"Conta {account} com mais de uma aposta na mesma rodada")
+                continue
+            try:
+                if bet.get("token"):
+                    self.register(account, bet["token"], bet.get("wallet_id"), bet.get("proxies"))
+                client = self.clients.get(account)
+                if client is None:
+                    raise ValueError(f"Conta {account} não registrada")
+                if game == "crash":
+                    prepared[account] = client.prepare_crash_bet(bet["amount"], bet.get("cashout", 2))
+                else:
+                    prepared[account] = client.prepare_double_bet(bet["color"], bet["amount"])
+            except Exception as e:
+                errors[account] = self.error_result(str(e) or type(e).__name__)
+        return prepared, errors
+
+    @staticmethod
+    def unknown_result():
+        return {
+            "result": None,
+            "object": {"error": "timeout"},
+            "message": "Aposta sem confirmação, o saldo será conferido"
+        }
+
+    async def submit(self, account, prepared, game, sent):
+        async with self.semaphore:
+            sent.add(account)
+            try:
+                return await self.clients[account].place_bet(prepared, game)
+            except Exception as e:
+                return self.error_result(str(e) or type(e).__name__)
+
+    async def dispatch(self, bets, game="double", timeout=None):
+        started = time.perf_counter()
+        if timeout is None:
+            timeout = self.betting_time_left(game)
+        if timeout is None:
+            raise ValueError("Janela de apostas desconhecida, informe o timeout ou um scheduler")
+        prepared, errors = self.prepare(bets, game)
+        sent = set()
+        tasks = {account: asyncio.ensure_future(self.submit(account, request, game, sent))
+                 for account, request in prepared.items()}
+        if not tasks:
+            return errors
+        done, pending = await asyncio.wait(tasks.values(), timeout=max(timeout, 0))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.last_duration = time.perf_counter() - started
+        results = {}
+        for account, task in tasks.items():
+            if task in done:
+                results[account] = task.result()
+            elif account in sent:
+                # the POST may already be on the wire, only the server knows whether the bet was taken
+                self.clients[account].wallet.invalidate()
+                results[account] = self.unknown_result()
+            else:
+                results[account] = self.error_result("timeout")
+        results.update(errors)
+        return results
+
+    async def close(self):
+        await self.transport.close()
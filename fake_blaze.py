@@ -0,0 +1,209 @@
+import sys
+import time
+import random
+import asyncio
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+TIMING = {
+    "double": (("waiting", 15.0), ("rolling", 7.5), ("complete", 3.0)),
+    "crash": (("waiting", 6.0), ("graphing", 8.0), ("complete", 3.0)),
+}
+URL_PATHS = {"double": "roulette", "crash": "crash"}
+
+
+def format_timestamp(moment):
+    if not isinstance(moment, datetime):
+        moment = datetime.fromtimestamp(moment, timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def draw(game, generator):
+    if game == "crash":
+        return {"crash_point": f"{max(1.0, 0.99 / (1 - generator.random())):.2f}"}
+    roll = generator.randint(0, 14)
+    return {"roll": roll, "color": 0 if roll == 0 else 1 if roll <= 7 else 2}
+
+
+def make_rounds(game, count, seed=0, interval=30, end=None):
+    generator = random.Random(seed)
+    end = end or datetime.now(timezone.utc)
+    rounds = []
+    for index in range(count):
+        created_at = end - timedelta(seconds=interval * (count - index))
+        item = {"id": f"{game[0]}{seed}x{index:09d}", "created_at": format_timestamp(created_at),
+                "status": "complete"}
+        item.update(draw(game, generator))
+        rounds.append(item)
+    return rounds
+
+
+class RoundClock(object):
+
+    def __init__(self, game, phases, seed=0, started_at=None):
+        self.game = game
+        self.phases = phases
+        self.length = sum(duration for _, duration in phases)
+        self.seed = seed
+        self.started_at = time.time() if started_at is None else started_at
+
+    def position(self, now=None):
+        elapsed = (time.time() if now is None else now) - self.started_at
+        index = int(elapsed // self.length)
+        offset = elapsed - index * self.length
+        phase_start = 0.0
+        for status, duration in self.phases:
+            if offset < phase_start + duration:
+                break
+            phase_start += duration
+        return index, status, self.started_at + index * self.length + phase_start
+
+    def completed_at(self, index):
+        return self.started_at + index * self.length + self.length - self.phases[-1][1]
+
+    def result(self, index):
+        return draw(self.game, random.Random(self.seed * 1000003 + index))
+
+    def round(self, index, status=None, updated_at=None):
+        created_at = self.started_at + index * self.length
+        item = {"id": f"{self.game[0]}live{index:09d}", "status": status or "complete",
+                "created_at": format_timestamp(created_at),
+                "updated_at": format_timestamp(updated_at or self.completed_at(index))}
+        if self.game == "crash":
+            item["crash_point"] = None
+        else:
+            item.update(color=None, roll=None)
+        if item["status"] == "complete":
+            item.update(self.result(index))
+        return item
+
+    def current(self, now=None):
+        index, status, updated_at = self.position(now)
+        return self.round(index, status, updated_at)
+
+    def recent(self, count=20, now=None):
+        index, status, _ = self.position(now)
+        last = index if status == "complete" else index - 1
+        return [self.round(item) for item in range(last, max(last - count, -1), -1)]
+
+
+class FakeBlaze(object):
+
+    def __init__(self, rounds=10000, page_size=50, latency=0.0, seed=0, timing=None, balance=1000.0):
+        self.page_size = page_size
+        self.latency = latency
+        self.history = {game: make_rounds(game, rounds, seed) for game in ("double", "crash")}
+        self.clocks = {game: RoundClock(game, (timing or TIMING)[game], seed) for game in ("double", "crash")}
+        self.balance = balance
+        self.bets = []
+        self.open_bets = []
+        self.requests = {}
+        self.runner = None
+        self.app = web.Application()
+        for game, url_path in URL_PATHS.items():
+            self.app.router.add_get(f"/api/{url_path}_games/history", self.handle_history(game))
+            self.app.router.add_get(f"/api/{url_path}_games/current", self.handle_current(game))
+            self.app.router.add_get(f"/api/{url_path}_games/recent", self.handle_recent(game))
+            self.app.router.add_get(f"/api/v1/{game}/result", self.handle_current(game))
+        self.app.router.add_get("/api/wallets", self.handle_wallets)
+        self.app.router.add_get("/api/users/me", self.handle_profile)
+        self.app.router.add_post("/api/roulette_bets", self.handle_bet("double"))
+        self.app.router.add_post("/api/crash/round/enter", self.handle_bet("crash"))
+        self.app.router.add_post("/api/crash/round/cashout", self.handle_cashout)
+
+    async def delay(self, request):
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def handle_history(self, game):
+        async def handler(request):
+            await self.delay(request)
+            page = int(request.query.get("page", 1))
+            rounds = self.history[game]
+            total_pages = (len(rounds) + self.page_size - 1) // self.page_size
+            end = len(rounds) - (page - 1) * self.page_size
+            records = rounds[max(end - self.page_size, 0):max(end, 0)][::-1] if page >= 1 else []
+            return web.json_response({"total_pages": total_pages, "records": records})
+        return handler
+
+    def handle_current(self, game):
+        async def handler(request):
+            await self.delay(request)
+            return web.json_response(self.clocks[game].current())
+        return handler
+
+    def handle_recent(self, game):
+        async def handler(request):
+            await self.delay(request)
+            return web.json_response(self.clocks[game].recent())
+        return handler
+
+    def settle(self, now=None):
+        remaining = []
+        for game, index, data in self.open_bets:
+            clock = self.clocks[game]
+            if clock.completed_at(index) > (time.time() if now is None else now):
+                remaining.append((game, index, data))
+                continue
+            result = clock.result(index)
+            amount = float(data.get("amount", 0))
+            if game == "crash":
+                cashout = float(data.get("auto_cashout_at") or 0)
+                if cashout and float(result["crash_point"]) >= cashout:
+                    self.balance += amount * cashout
+            elif data.get("color") == result["color"]:
+                self.balance += amount * (14 if result["color"] == 0 else 2)
+        self.open_bets = remaining
+
+    async def handle_wallets(self, request):
+        await self.delay(request)
+        self.settle()
+        return web.json_response([{"id": 1, "balance": f"{self.balance:.2f}", "currency_type": "BRL"}])
+
+    async def handle_profile(self, request):
+        await self.delay(request)
+        return web.json_response({"id": 1, "username": "fake", "tax_id": "00000000000"})
+
+    def handle_bet(self, game):
+        async def handler(request):
+            await self.delay(request)
+            data = await request.json()
+            current = self.clocks[game].current()
+            if current["status"] != "waiting":
+                return web.json_response({"error": {"message": "Apostas encerradas"}}, status=400)
+            amount = float(data.get("amount", 0))
+            self.balance -= amount
+            self.bets.append((game, current["id"], time.time(), data))
+            self.open_bets.append((game, self.clocks[game].position()[0], data))
+            return web.json_response({"id": len(self.bets), "round_id": current["id"], "amount": amount})
+        return handler
+
+    async def handle_cashout(self, request):
+        await self.delay(request)
+        return web.json_response({"success": True})
+
+    async def start(self, host="127.0.0.1", port=0):
+        for clock in self.clocks.values():
+            clock.started_at = time.time()
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+        self.runner = None
+
+
+async def serve(port=8080):
+    server = FakeBlaze()
+    print(f"Fake Blaze em {await server.start(port=port)}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(*map(int, sys.argv[1:2])))
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime, timezone
+import numpy as np
+
+COLOR_NAMES = {
+    "double": ("branco", "vermelho", "preto"),
+    "crash": ("preto", "verde"),
+}
+COLUMNS = {
+    "double": (("id", "S32"), ("created_at", "int64"), ("color", "uint8"), ("roll", "uint8")),
+    "crash": (("id", "S32"), ("created_at", "int64"), ("color", "uint8"), ("crash_point", "float32")),
+}
+
+
+def parse_millis(value):
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def encode_record(game, item):
+    created_at = parse_millis(item["created_at"])
+    if game == "crash":
+        point = float(item["crash_point"])
+        return str(item["id"]).encode(), created_at, 0 if point < 2 else 1, point
+    return str(item["id"]).encode(), created_at, int(item["color"]), int(item["roll"])
+
+
+class HistoryStore(object):
+
+    def __init__(self, game="double", path="history", capacity=4096):
+        self.game = game
+        self.path = path
+        self.columns = COLUMNS[game]
+        self.size = 0
+        self.sorted = True
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.columns}
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self.load()
+
+    def column_path(self, name):
+        return os.path.join(self.path, f"{self.game}.{name}.bin")
+
+    def load(self):
+        loaded = {}
+        for name, dtype in self.columns:
+            file_path = self.column_path(name)
+            loaded[name] = np.fromfile(file_path, dtype=dtype) if os.path.exists(file_path) \
+                else np.empty(0, dtype=dtype)
+        # a crash between column writes can leave one file longer than the others
+        size = min(len(values) for values in loaded.values())
+        self.reserve(size)
+        for name, values in loaded.items():
+            self.arrays[name][:size] = values[:size]
+        self.size = size
+        if size > 1:
+            created_at = self.arrays["created_at"][:size]
+            self.sorted = bool(np.all(created_at[1:] >= created_at[:-1]))
+
+    def reserve(self, size):
+        capacity = len(self.arrays["id"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, dtype in self.columns:
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self.size] = self.arrays[name][:self.size]
+            self.arrays[name] = grown
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_id(self):
+        return self.arrays["id"][self.size - 1].decode() if self.size else None
+
+    @property
+    def last_timestamp(self):
+        return int(self.arrays["created_at"][self.size - 1]) if self.size else None
+
+    def append(self, items):
+        records = [encode_record(self.game, item) for item in items]
+        if not records:
+            return 0
+        batch = {name: np.array([record[index] for record in records], dtype=dtype)
+                 for index, (name, dtype) in enumerate(self.columns)}
+        if self.size and batch["created_at"][0] < self.arrays["created_at"][self.size - 1]:
+            self.sorted = False
+        if len(records) > 1 and np.any(batch["created_at"][1:] < batch["created_at"][:-1]):
+            self.sorted = False
+        self.reserve(self.size + len(records))
+        for name, _ in self.columns:
+            self.arrays[name][self.size:self.size + len(records)] = batch[name]
+            if self.path:
+                with open(self.column_path(name), "ab") as column_file:
+                    column_file.write(batch[name].tobytes())
+        self.size += len(records)
+        return len(records)
+
+    def newer(self, items):
+        last = self.last_timestamp
+        if last is None:
+            return list(items)
+        return [item for item in items if parse_millis(item["created_at"]) > last]
+
+    def sync(self, client, max_pages=10):
+        recent = client.get_recent(self.game)
+        if not recent:
+            return 0
+        items = self.newer(recent)
+        if self.size and len(items) == len(recent):
+            for page in range(1, max_pages + 1):
+                history = client.get_history(self.game, page)
+                records = history.get("records", []) if isinstance(history, dict) else history
+                newer = self.newer(records)
+                items.extend(newer)
+                if not records or len(newer) < len(records):
+                    break
+        unique = {}
+        for item in items:
+            unique.setdefault(str(item["id"]), item)
+        return self.append(sorted(unique.values(), key=lambda item: parse_millis(item["created_at"])))
+
+    def compact(self):
+        if self.sorted:
+            return self.size
+        ids = self.arrays["id"][:self.size]
+        order = np.argsort(self.arrays["created_at"][:self.size], kind="stable")
+        _, first = np.unique(ids[order], return_index=True)
+        order = order[np.sort(first)]
+        for name, _ in self.columns:
+            self.arrays[name][:len(order)] = self.arrays[name][order]
+        self.size = len(order)
+        self.sorted = True
+        if self.path:
+            for name, _ in self.columns:
+                temporary = self.column_path(name) + ".tmp"
+                self.arrays[name][:self.size].tofile(temporary)
+                os.replace(temporary, self.column_path(name))
+        return self.size
+
+    def last(self, n=None):
+        # views share memory with the store; they stay valid until the next
+        # append grows the buffers
+        self.compact()
+        start = 0 if n is None else max(self.size - n, 0)
+        return {name: self.arrays[name][start:self.size] for name, _ in self.columns}
+
+    def last_items(self, n=20):
+        view = self.last(n)
+        names = COLOR_NAMES[self.game]
+        if self.game == "crash":
+            return {"items": [{"color": names[color], "point": f"{point:.2f}"}
+                              for color, point in zip(view["color"][::-1], view["crash_point"][::-1])]}
+        return {"items": [{"color": names[color], "value": int(roll),
+                           "created_date": datetime.fromtimestamp(created_at / 1000, timezone.utc)
+                          .strftime("%Y-%m-%d %H:%M:%S")}
+                          for color, roll, created_at in zip(view["color"][::-1], view["roll"][::-1],
+                                                             view["created_at"][::-1])]}
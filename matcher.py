@@ -0,0 +1,266 @@
+import re
+import threading
+from collections import deque
+from sqlalchemy.orm import selectinload
+from bot.models import User
+
+COLOR_CODES = {
+    "double": {"branco": 0, "b": 0, "vermelho": 1, "v": 1, "preto": 2, "p": 2, "0": 0, "1": 1, "2": 2},
+    "crash": {"preto": 0, "p": 0, "verde": 1, "v": 1, "0": 0, "1": 1},
+}
+SEPARATORS = re.compile(r"[\s,;|>/-]+")
+
+
+def parse_sequence(game, sequence):
+    codes = COLOR_CODES[game]
+    tokens = sequence if isinstance(sequence, (list, tuple)) else SEPARATORS.split(str(sequence or "").strip())
+    parsed = []
+    for token in tokens:
+        token = str(token).strip().lower()
+        if not token:
+            continue
+        if token in codes:
+            parsed.append(codes[token])
+        elif all(char in codes for char in token):
+            # "VVP" style sequences without separators
+            parsed.extend(codes[char] for char in token)
+        else:
+            raise ValueError(f"Sequência inválida: {sequence}")
+    return tuple(parsed)
+
+
+def result_code(game, data):
+    if game == "crash":
+        return 0 if float(data["crash_point"]) < 2 else 1
+    return int(data["color"])
+
+
+class Automaton(object):
+
+    def __init__(self, words, alphabet):
+        children = [{}]
+        self.words = [None]
+        for word in words:
+            node = 0
+            for code in word:
+                child = children[node].get(code)
+                if child is None:
+                    child = len(children)
+                    children[node][code] = child
+                    children.append({})
+                    self.words.append(None)
+                node = child
+            self.words[node] = word
+        self.known = set(words)
+        count = len(children)
+        fail = [0] * count
+        # links jump straight to the next node on the failure chain that ends a word
+        self.links = [0] * count
+        self.transitions = [None] * count
+        self.transitions[0] = {code: children[0].get(code, 0) for code in alphabet}
+        queue = deque(children[0].values())
+        while queue:
+            node = queue.popleft()
+            transitions = {}
+            for code in alphabet:
+                child = children[node].get(code)
+                if child is None:
+                    transitions[code] = self.transitions[fail[node]][code]
+                    continue
+                fail[child] = self.transitions[fail[node]][code]
+                self.links[child] = fail[child] if self.words[fail[child]] is not None else self.links[fail[child]]
+                transitions[code] = child
+                queue.append(child)
+            self.transitions[node] = transitions
+
+
+class StrategyMatcher(object):
+
+    def __init__(self, game="double"):
+        self.game = game
+        self.codes = COLOR_CODES[game]
+        self.alphabet = sorted(set(self.codes.values()))
+        self.patterns = {}
+        self.owners = {}
+        self.users = {}
+        self.history = deque(maxlen=1)
+        self.state = 0
+        self.automaton = None
+        self.outputs = {}
+        self.lock = threading.RLock()
+        self.pending = False
+        self.rebuilding = None
+
+    def add(self, user_id, strategy_id, sequence, target):
+        codes = parse_sequence(self.game, sequence)
+        key = (user_id, strategy_id)
+        self.discard(key)
+        if not codes:
+            return False
+        with self.lock:
+            self.patterns[key] = (codes, target)
+            self.owners.setdefault(codes, set()).add(key)
+            self.outputs = {}
+            self.users.setdefault(user_id, set()).add(strategy_id)
+            if len(codes) > self.history.maxlen:
+                self.history = deque(self.history, maxlen=len(codes))
+            if self.automaton is not None and codes not in self.automaton.known:
+                self.schedule()
+        return True
+
+    def discard(self, key):
+        with self.lock:
+            pattern = self.patterns.pop(key, None)
+            if pattern is None:
+                return False
+            owners = self.owners.get(pattern[0])
+            owners.discard(key)
+            if not owners:
+                del self.owners[pattern[0]]
+            self.outputs = {}
+            strategies = self.users.get(key[0])
+            if strategies is not None:
+                strategies.discard(key[1])
+                if not strategies:
+                    del self.users[key[0]]
+            if self.automaton is not None and len(self.automaton.known) > 4 * (len(self.owners) + 1):
+                # words nobody uses anymore only cost memory, drop them once they dominate
+                self.schedule()
+        return True
+
+    def remove(self, user_id, strategy_id):
+        return self.discard((user_id, strategy_id))
+
+    def remove_user(self, user_id):
+        for strategy_id in list(self.users.get(user_id, ())):
+            self.discard((user_id, strategy_id))
+
+    def set_user(self, user_id, strategies):
+        self.remove_user(user_id)
+        for strategy in strategies:
+            values = strategy if isinstance(strategy, dict) else strategy.as_dict()
+            try:
+                self.add(user_id, values["id"], values["sequence"], values["color"])
+            except ValueError as e:
+                print(f"Estratégia {values['id']} do usuário {user_id} ignorada: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.patterns.clear()
+            self.owners.clear()
+            self.users.clear()
+            self.outputs = {}
+
+    def build(self):
+        with self.lock:
+            words = list(self.owners)
+        automaton = Automaton(words, self.alphabet)
+        with self.lock:
+            self.automaton = automaton
+            self.outputs = {}
+            self.state = 0
+            for code in self.history:
+                self.state = automaton.transitions[self.state][code]
+        return automaton
+
+    def schedule(self):
+        # new words are matched once the rebuilt automaton is swapped in, rounds keep using the current one
+        with self.lock:
+            self.pending = True
+            if self.rebuilding is None:
+                self.rebuilding = threading.Thread(target=self.rebuild, name=f"matcher-{self.game}", daemon=True)
+                self.rebuilding.start()
+
+    def rebuild(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.rebuilding = None
+                    return
+                self.pending = False
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Erro ao reconstruir estratégias: {e}")
+
+    def wait(self):
+        thread = self.rebuilding
+        if thread is not None:
+            thread.join()
+
+    def encode(self, color):
+        if isinstance(color, int):
+            return color
+        return self.codes[str(color).strip().lower()]
+
+    def step(self, color):
+        code = self.encode(color)
+        if self.automaton is None:
+            self.build()
+        with self.lock:
+            automaton = self.automaton
+            self.history.append(code)
+            self.state = automaton.transitions[self.state][code]
+            matches = self.outputs.get(self.state)
+            if matches is None:
+                matches = self.outputs[self.state] = self.collect(automaton, self.state)
+        return matches
+
+    def collect(self, automaton, node):
+        if automaton.words[node] is None:
+            node = automaton.links[node]
+        matches = []
+        while node:
+            for user_id, strategy_id in self.owners.get(automaton.words[node], ()):
+                matches.append((user_id, strategy_id, self.patterns[(user_id, strategy_id)][1]))
+            node = automaton.links[node]
+        return tuple(matches)
+
+    def feed(self, colors):
+        matches = []
+        for color in colors:
+            matches = self.step(color)
+        return matches
+
+    def reset(self):
+        with self.lock:
+            self.history.clear()
+            self.state = 0
+
+    def stats(self):
+        return {"game": self.game, "users": len(self.users), "strategies": len(self.patterns),
+                "nodes": len(self.automaton.transitions) if self.automaton is not None else 0}
+
+
+class MatcherRegistry(object):
+
+    def __init__(self, games=("double", "crash")):
+        self.matchers = {game: StrategyMatcher(game) for game in games}
+
+    def matcher(self, game):
+        return self.matchers[str(game).lower()]
+
+    def set_user(self, user_id, game, strategies):
+        game = str(game or "double").lower()
+        for name, matcher in self.matchers.items():
+            if name == game:
+                matcher.set_user(user_id, strategies)
+            else:
+                matcher.remove_user(user_id)
+
+    def remove_user(self, user_id):
+        for matcher in self.matchers.values():
+            matcher.remove_user(user_id)
+
+    def load(self, session, model=User):
+        for matcher in self.matchers.values():
+            matcher.clear()
+        users = session.query(model).options(selectinload(model.strategies)).filter(model.is_active.is_(True)).all()
+        for user in users:
+            self.set_user(user.id, user.game_type, user.strategies)
+        for matcher in self.matchers.values():
+            matcher.build()
+        return len(users)
+
+    def step(self, game, color):
+        return self.matcher(game).step(color)
@@ -0,0 +1,230 @@
+import re
+import time
+import bisect
+import random
+import threading
+import contextvars
+from functools import lru_cache
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ID_SEGMENT = re.compile(r"/(\d+|[0-9a-fA-F]{8,}|[0-9a-fA-F-]{36})(?=/|$)")
+current_queries = contextvars.ContextVar("current_queries", default=None)
+
+
+@lru_cache(maxsize=1024)
+def endpoint(url):
+    return ID_SEGMENT.sub("/:id", urlsplit(url).path) or "/"
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        seen = 0
+        for index, amount in enumerate(self.counts):
+            seen += amount
+            if seen >= q * self.count:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class Metrics(object):
+
+    def __init__(self, sample_rate=1.0, enabled=True):
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self.tracking = False
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.server = None
+        self.reporter = None
+        self.stopped = threading.Event()
+
+    def sampled(self):
+        return self.enabled and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        if not self.sampled():
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_request(self, method, url, status, elapsed):
+        path = endpoint(url)
+        self.increment("http_requests_total", method=method, endpoint=path, status=status)
+        self.observe("http_request_seconds", elapsed, method=method, endpoint=path)
+
+    @contextmanager
+    def operation(self, name):
+        if not self.enabled:
+            yield
+            return
+        if not self.tracking:
+            track_queries()
+            self.tracking = True
+        counter = [0]
+        token = current_queries.set(counter)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            yield
+            status = "ok"
+        finally:
+            current_queries.reset(token)
+            self.increment("controller_operations_total", operation=name, status=status)
+            self.increment("controller_queries_total", counter[0], operation=name)
+            self.observe("controller_operation_seconds", time.perf_counter() - started, operation=name)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                          for key, histogram in self.histograms.items()}
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.snapshot()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items(), key=str):
+                if counter_name == name:
+                    lines.append(f"{name}{label_text(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (histogram_name, labels), (buckets, counts, total, count) in sorted(histograms.items(), key=str):
+                if histogram_name != name:
+                    continue
+                seen = 0
+                for bound, amount in zip(buckets + (float("inf"),), counts):
+                    seen += amount
+                    bound = "+Inf" if bound == float("inf") else bound
+                    lines.append(f"{name}_bucket{label_text(labels + (('le', bound),))} {seen}")
+                lines.append(f"{name}_sum{label_text(labels)} {total}")
+                lines.append(f"{name}_count{label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            rows = [(name, labels, histogram.count, histogram.sum / histogram.count if histogram.count else 0,
+                     histogram.quantile(0.5), histogram.quantile(0.95))
+                    for (name, labels), histogram in self.histograms.items()]
+        return [f"{name}{label_text(labels)} n={count} avg={average * 1000:.1f}ms "
+                f"p50<={p50 * 1000:.0f}ms p95<={p95 * 1000:.0f}ms"
+                for name, labels, count, average, p50, p95 in sorted(rows, key=str) if count]
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200 if self.path in ("/", "/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        if self.server is None:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True).start()
+        return self.server
+
+    def report(self, interval=60):
+        while not self.stopped.wait(interval):
+            for line in self.summary():
+                print(f"[métricas] {line}")
+
+    def start_reporter(self, interval=60):
+        if self.reporter is None:
+            self.stopped.clear()
+            self.reporter = threading.Thread(target=self.report, args=(interval,), name="metrics-reporter",
+                                             daemon=True)
+            self.reporter.start()
+        return self.reporter
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.server = None
+        self.reporter = None
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+def count_query(connection, cursor, statement, parameters, context, executemany):
+    counter = current_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def track_queries():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    if not event.contains(Engine, "before_cursor_execute", count_query):
+        event.listen(Engine, "before_cursor_execute", count_query)
+
+
+metrics = Metrics()
+
+
+def configure(sample_rate=None, port=None, interval=None, enabled=None):
+    if enabled is not None:
+        metrics.enabled = enabled
+    if sample_rate is not None:
+        metrics.sample_rate = sample_rate
+    if port:
+        metrics.serve(port)
+    if interval:
+        metrics.start_reporter(interval)
+    return metrics
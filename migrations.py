@@ -0,0 +1,54 @@
+from sqlalchemy import inspect, text
+from bot.models import Base
+
+
+def drop_index(connection, table_name, index_name):
+    quote = connection.dialect.identifier_preparer.quote
+    if connection.dialect.name == "mysql":
+        connection.execute(text(f"DROP INDEX {quote(index_name)} ON {quote(table_name)}"))
+    else:
+        connection.execute(text(f"DROP INDEX {quote(index_name)}"))
+
+
+def add_column(connection, table_name, column):
+    quote = connection.dialect.identifier_preparer.quote
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column.name)} {column_type}"))
+
+
+def migrate(engine, verbose=True):
+    Base.metadata.create_all(bind=engine)
+    changes = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                # only nullable columns can be added to tables that already hold rows
+                if column.name not in columns and column.nullable:
+                    add_column(connection, table.name, column)
+                    changes.append(f"add column {table.name}.{column.name}")
+            declared = {index.name for index in table.indexes}
+            existing = set()
+            for index in inspector.get_indexes(table.name):
+                name = index["name"]
+                existing.add(name)
+                if name and name.startswith(f"ix_{table.name}_") and name not in declared:
+                    drop_index(connection, table.name, name)
+                    changes.append(f"drop {name}")
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    changes.append(f"create {index.name}")
+    if verbose:
+        for change in changes:
+            print(f"Migração: {change}")
+    return changes
+
+
+# entry points: python -m bot.migrations (schema), python -m bot.runtime <target> (bots, expiration
+# sweeper and outbox dispatcher), python -m bot.sweeper [interval] and python -m bot.outbox [interval]
+# (each service alone, for deployments that run the bots elsewhere)
+if __name__ == "__main__":
+    from bot.db.database import engine
+    migrate(engine)
@@ -1,46 +1,124 @@
+import json
+from datetime import datetime, date
+from operator import attrgetter, itemgetter
 from sqlalchemy import Boolean, Column,\
     ForeignKey, Integer, BigInteger, Float,\
-    String, inspect, DateTime
+    String, Text, Index, inspect, DateTime
 from sqlalchemy.orm import relationship
 from bot.db.database import Base
 
 
+_row_getters = {}
+
+
+def row_getter(cls):
+    getter = _row_getters.get(cls)
+    if getter is None:
+        keys = tuple(c.key for c in inspect(cls).column_attrs)
+        loaded = itemgetter(*keys) if len(keys) > 1 else lambda state: (state[keys[0]],)
+        unloaded = attrgetter(*keys) if len(keys) > 1 else lambda obj: (getattr(obj, keys[0]),)
+
+        def values(obj):
+            # loaded columns are read straight from the instance dict, anything
+            # expired or pending goes through the instrumented attributes
+            try:
+                return loaded(obj.__dict__)
+            except KeyError:
+                return unloaded(obj)
+
+        getter = _row_getters[cls] = (keys, values)
+    return getter
+
+
+def objects_as_dicts(objs):
+    if not objs:
+        return []
+    cls = type(objs[0])
+    keys, values = row_getter(cls)
+    return [dict(zip(keys, values(obj))) if type(obj) is cls else object_as_dict(obj) for obj in objs]
+
+
 def object_as_dict(obj):
     if isinstance(obj, list):
-        return [{c.key: getattr(item, c.key)
-                 for c in inspect(item).mapper.column_attrs} for item in obj]
-    else:
-        return {c.key: getattr(obj, c.key)
-                for c in inspect(obj).mapper.column_attrs}
+        return objects_as_dicts(obj)
+    keys, values = row_getter(type(obj))
+    return dict(zip(keys, values(obj)))
+
+
+def bundle_from_row(user, settings=None, variables=None, strategies=None):
+    return {"user": object_as_dict(user),
+            "settings": object_as_dict(settings) if settings is not None else None,
+            "variables": object_as_dict(variables) if variables is not None else None,
+            "strategies": objects_as_dicts(strategies) if strategies else None}
+
+
+def loaded_relation(obj, key):
+    relation = obj.__dict__.get(key)
+    return getattr(obj, key) if relation is None else relation
+
+
+def user_bundle(user):
+    settings = loaded_relation(user, "settings")
+    variables = loaded_relation(user, "variables")
+    return bundle_from_row(user,
+                           settings[0] if settings else None,
+                           variables[0] if variables else None,
+                           loaded_relation(user, "strategies"))
+
+
+def user_bundles(users):
+    return [user_bundle(user) for user in users]
+
+
+def copy_bundle(bundle):
+    return {"user": dict(bundle["user"]),
+            "settings": dict(bundle["settings"]) if bundle["settings"] is not None else None,
+            "variables": dict(bundle["variables"]) if bundle["variables"] is not None else None,
+            "strategies": [dict(strategy) for strategy in bundle["strategies"]]
+            if bundle["strategies"] is not None else None}
+
+
+def bundle_as_bytes(bundle):
+    return json.dumps(bundle, default=json_default, separators=(",", ":")).encode()
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_active_betting", "is_active", "is_betting"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     user_bot = Column(BigInteger, index=True, nullable=False)
     email = Column(String, unique=True, index=True)
-    name = Column(String, unique=False, index=True)
+    name = Column(String, unique=False)
     password = Column(String, nullable=False)
-    account_type = Column(String, index=True, default="DEMO")
-    game_type = Column(String, index=True, default="DOUBLE")
-    hashed_token = Column(String(200), index=True, nullable=True)
+    account_type = Column(String, default="DEMO")
+    game_type = Column(String, default="DOUBLE")
+    hashed_token = Column(String(200), nullable=True)
     already_tested = Column(Boolean, default=False)
-    token = Column(String(200), index=True, nullable=True)
-    process_pid = Column(BigInteger, index=True, nullable=True)
-    wallet = Column(String(20), index=True, nullable=True)
+    token = Column(String(200), nullable=True)
+    process_pid = Column(BigInteger, nullable=True)
+    shard_id = Column(Integer, nullable=True)
+    wallet = Column(String(20), nullable=True)
     is_active = Column(Boolean, default=False)
     is_testing = Column(Boolean, default=False)
     payment_id = Column(BigInteger, index=True, nullable=True)
-    payment_expire_in = Column(Integer, index=True, nullable=True)
-    payment_status = Column(String, index=True, default="PENDING")
+    payment_expire_in = Column(Integer, nullable=True)
+    payment_status = Column(String, default="PENDING")
     is_betting = Column(Boolean, default=False)
-    color_bet = Column(String(20), index=True, nullable=True)
-    color_before = Column(String(20), index=True, nullable=True)
-    point_bet = Column(String(20), index=True, nullable=True)
-    point_before = Column(String(20), index=True, nullable=True)
+    color_bet = Column(String(20), nullable=True)
+    color_before = Column(String(20), nullable=True)
+    point_bet = Column(String(20), nullable=True)
+    point_before = Column(String(20), nullable=True)
     created_at = Column(DateTime, nullable=True)
-    expire_in = Column(DateTime, nullable=True)
+    expire_in = Column(DateTime, index=True, nullable=True)
 
     settings = relationship("Settings",
                             back_populates="owner",
@@ -62,24 +140,24 @@ class User(Base):
 class Settings(Base):
     __tablename__ = "settings"
 
-    id = Column(Integer, primary_key=True, index=True)
-    strategy_type = Column(String, index=True, default="SYSTEM")
-    enter_type = Column(String, index=True, default="VALOR")
-    enter_percent = Column(Float, index=True, default=0.5)
-    first_amount = Column(Float, index=True, default=2.0)
-    first_protection = Column(Float, index=True, default=1.8)
-    enter_value = Column(Float, index=True, default=2.0)
-    stop_type = Column(String, index=True, default="VALOR")
-    stop_gain = Column(String, index=True, default="100")
-    stop_loss = Column(String, index=True, default="30")
-    protection_hand = Column(String, index=True, default="NÃO")
-    protection_value = Column(Float, index=True, default=1.8)
-    martingale = Column(Integer, index=True, default=2)
-    white_martingale = Column(String, index=True, default="NÃO")
-    martingale_multiplier = Column(Float, index=True)
-    white_multiplier = Column(Float, index=True)
-    quantity_cycles = Column(Integer, index=True, default=0)
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    id = Column(Integer, primary_key=True)
+    strategy_type = Column(String, default="SYSTEM")
+    enter_type = Column(String, default="VALOR")
+    enter_percent = Column(Float, default=0.5)
+    first_amount = Column(Float, default=2.0)
+    first_protection = Column(Float, default=1.8)
+    enter_value = Column(Float, default=2.0)
+    stop_type = Column(String, default="VALOR")
+    stop_gain = Column(String, default="100")
+    stop_loss = Column(String, default="30")
+    protection_hand = Column(String, default="NÃO")
+    protection_value = Column(Float, default=1.8)
+    martingale = Column(Integer, default=2)
+    white_martingale = Column(String, default="NÃO")
+    martingale_multiplier = Column(Float)
+    white_multiplier = Column(Float)
+    quantity_cycles = Column(Integer, default=0)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="settings")
 
@@ -90,16 +168,16 @@ class Settings(Base):
 class Variables(Base):
     __tablename__ = "variables"
 
-    id = Column(Integer, primary_key=True, index=True)
-    count_loss = Column(Integer, index=True, default=0)
-    count_win = Column(Integer, index=True, default=0)
-    count_martingale = Column(Integer, index=True, default=0)
-    profit = Column(Float, index=True, default=0)
-    balance = Column(Float, index=True, default=0)
-    first_balance = Column(Float, index=True, default=0)
-    created = Column(Integer, index=True, default=0)
-    is_gale = Column(Boolean, index=True, default=0)
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    id = Column(Integer, primary_key=True)
+    count_loss = Column(Integer, default=0)
+    count_win = Column(Integer, default=0)
+    count_martingale = Column(Integer, default=0)
+    profit = Column(Float, default=0)
+    balance = Column(Float, default=0)
+    first_balance = Column(Float, default=0)
+    created = Column(Integer, default=0)
+    is_gale = Column(Boolean, default=0)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="variables")
 
@@ -110,12 +188,31 @@ class Variables(Base):
 class Strategies(Base):
     __tablename__ = "strategies"
 
-    id = Column(Integer, primary_key=True, index=True)
-    sequence = Column(String, index=True)
-    color = Column(String, index=True)
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    id = Column(Integer, primary_key=True)
+    sequence = Column(String)
+    color = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
     owner = relationship("User", back_populates="strategies")
 
     def as_dict(self):
         return object_as_dict(self)
+
+
+class Outbox(Base):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_pending", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), default="PENDING")
+    attempts = Column(Integer, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    next_attempt_at = Column(DateTime, default=datetime.now)
+
+    def as_dict(self):
+        return object_as_dict(self)
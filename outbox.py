@@ -0,0 +1,125 @@
+import sys
+import json
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, func
+from bot.utils.messages import info_message, trial_message
+from bot.models import User, Outbox, json_default
+from bot.db.database import DBSession
+
+SKIP_LOCKED_DIALECTS = ("postgresql", "mysql", "oracle")
+
+
+def enqueue(session, kind, user, **kwargs):
+    message = Outbox(kind=kind, payload=json.dumps(dict(kwargs, user=user.as_dict()), default=json_default))
+    session.add(message)
+    return message
+
+
+def load_user(values):
+    values = dict(values)
+    for column in User.__table__.columns:
+        if isinstance(column.type, DateTime) and isinstance(values.get(column.key), str):
+            values[column.key] = datetime.fromisoformat(values[column.key])
+    return User(**values)
+
+
+def send_message(kind, payload):
+    user = load_user(payload["user"])
+    if kind == "trial":
+        return trial_message(user, payload.get("kwargs") or {})
+    return info_message(user, payload.get("hashed_token"))
+
+
+class OutboxDispatcher(object):
+
+    def __init__(self, batch_size=50, concurrency=5, interval=1.0,
+                 max_attempts=5, backoff=2.0, lease=60, session_factory=DBSession):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.session_factory = session_factory
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.sent = 0
+        self.failed = 0
+
+    def claim(self):
+        now = datetime.now()
+        session = self.session_factory()
+        try:
+            query = session.query(Outbox).filter(Outbox.status == "PENDING", Outbox.next_attempt_at <= now) \
+                .order_by(Outbox.next_attempt_at).limit(self.batch_size)
+            if session.get_bind().dialect.name in SKIP_LOCKED_DIALECTS:
+                query = query.with_for_update(skip_locked=True)
+            batch = []
+            for message in query.all():
+                # another dispatcher may have leased the row since it was read, only send what this update took
+                claimed = session.query(Outbox).filter(Outbox.id == message.id, Outbox.status == "PENDING",
+                                                       Outbox.next_attempt_at <= now) \
+                    .update({Outbox.attempts: func.coalesce(Outbox.attempts, 0) + 1,
+                             Outbox.next_attempt_at: now + timedelta(seconds=self.lease)},
+                            synchronize_session=False)
+                if claimed:
+                    batch.append((message.id, message.kind, json.loads(message.payload), (message.attempts or 0) + 1))
+            session.commit()
+            return batch
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def finish(self, results):
+        now = datetime.now()
+        session = self.session_factory()
+        try:
+            for message_id, attempts, error in results:
+                values = {Outbox.status: "SENT", Outbox.last_error: None}
+                if error is not None:
+                    values = {Outbox.status: "FAILED" if attempts >= self.max_attempts else "PENDING",
+                              Outbox.last_error: error[:500],
+                              Outbox.next_attempt_at: now + timedelta(seconds=self.backoff ** attempts)}
+                session.query(Outbox).filter(Outbox.id == message_id).update(values, synchronize_session=False)
+            session.commit()
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    async def deliver(self, message_id, kind, payload, attempts):
+        async with self.semaphore:
+            try:
+                await asyncio.to_thread(send_message, kind, payload)
+                self.sent += 1
+                return message_id, attempts, None
+            except Exception as e:
+                self.failed += 1
+                return message_id, attempts, str(e) or type(e).__name__
+
+    async def drain(self):
+        batch = await asyncio.to_thread(self.claim)
+        if not batch:
+            return 0
+        results = await asyncio.gather(*(self.deliver(*message) for message in batch))
+        await asyncio.to_thread(self.finish, results)
+        return len(batch)
+
+    async def run(self):
+        while True:
+            try:
+                if await self.drain() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Erro ao enviar mensagens: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {"sent": self.sent, "failed": self.failed}
+
+
+if __name__ == "__main__":
+    asyncio.run(OutboxDispatcher(interval=float(sys.argv[1]) if len(sys.argv) > 1 else 1.0).run())
@@ -0,0 +1,238 @@
+import sys
+import json
+import asyncio
+from bot.api import BlazeClientAPI
+from bot.scheduler import PollScheduler
+from bot.matcher import result_code
+
+GAMES = ("double", "crash")
+SOCKET_PATH = "/tmp/blaze-rounds.sock"
+
+
+def round_event(game, data):
+    return {
+        "game": game,
+        "id": data.get("id"),
+        "status": data.get("status"),
+        "roll": data.get("roll"),
+        "color": data.get("color"),
+        "crash_point": data.get("crash_point"),
+        "created_at": data.get("created_at"),
+        "updated_at": data.get("updated_at"),
+        "finished": BlazeClientAPI.is_finished(game, data)
+    }
+
+
+class Subscription(object):
+
+    def __init__(self, game=None, maxsize=100, owner=None, user_id=None):
+        self.game = game
+        self.owner = owner
+        self.user_id = user_id
+        # the poller's scheduler sees every phase change, bots waiting on results only see the end
+        self.scheduler = owner.scheduler if owner is not None else None
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        if self.game and event["game"] != self.game:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def next_event(self):
+        return await self.queue.get()
+
+    async def wait_result(self):
+        while True:
+            event = await self.next_event()
+            latest = event if event["finished"] else None
+            # rounds that finished while nobody was reading are stale, only the newest one counts
+            while not self.queue.empty():
+                event = self.queue.get_nowait()
+                if event["finished"]:
+                    latest = event
+            if latest is not None:
+                return latest
+
+    def close(self):
+        if self.owner is not None:
+            self.owner.subscribers.discard(self)
+
+
+class RoundPoller(object):
+
+    def __init__(self, game="double", client=None, matcher=None):
+        self.game = game
+        self.client = client or BlazeClientAPI()
+        self.scheduler = self.client.get_scheduler(game)
+        self.matcher = matcher
+        self.subscribers = set()
+        self.last_state = None
+        self.last_result_id = None
+
+    def subscribe(self, maxsize=100, user_id=None):
+        subscription = Subscription(self.game, maxsize=maxsize, owner=self, user_id=user_id)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def match(self, event):
+        # one automaton step per round serves every subscribed user's strategies
+        signals = {}
+        try:
+            for user_id, strategy_id, target in self.matcher.step(result_code(self.game, event)):
+                signals.setdefault(user_id, []).append((strategy_id, target))
+        except Exception as e:
+            print(f"Erro ao verificar estratégias de {self.game}: {e}")
+        return signals
+
+    def publish(self, event):
+        signals = self.match(event) if self.matcher is not None and event["finished"] else None
+        for subscription in list(self.subscribers):
+            user_id = getattr(subscription, "user_id", None)
+            if signals is None or user_id is None:
+                subscription.put(event)
+            else:
+                subscription.put(dict(event, signals=signals.get(user_id, [])))
+
+    def update(self, data):
+        event = round_event(self.game, data)
+        state = (event["id"], event["status"])
+        if state == self.last_state:
+            return None
+        self.last_state = state
+        if event["finished"]:
+            if event["id"] == self.last_result_id:
+                return None
+            self.last_result_id = event["id"]
+        self.publish(event)
+        return event
+
+    async def poll(self):
+        response = await self.client.async_get_result(self.game)
+        if response:
+            return response.json()
+        return None
+
+    async def run(self):
+        while True:
+            data = None
+            try:
+                data = await self.poll()
+                if data:
+                    self.update(data)
+            except Exception as e:
+                pass
+            await asyncio.sleep(self.scheduler.next_delay(data))
+
+
+class RoundPublisher(object):
+
+    def __init__(self, path=SOCKET_PATH, max_buffer=256 * 1024):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.writers = set()
+        self.server = None
+        self.dropped = 0
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+        return self.server
+
+    async def handle(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            await reader.read()
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def put(self, event):
+        line = json.dumps(event).encode() + b"\n"
+        for writer in list(self.writers):
+            if writer.is_closing():
+                self.writers.discard(writer)
+                continue
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                # a stalled subscriber would grow the buffer forever, it reconnects and resumes from live rounds
+                print("Assinante lento desconectado do publicador de rodadas")
+                self.writers.discard(writer)
+                writer.transport.abort()
+                self.dropped += 1
+                continue
+            writer.write(line)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        self.writers.clear()
+
+
+class SocketSubscription(Subscription):
+
+    def __init__(self, game=None, path=SOCKET_PATH, retry_interval=1):
+        super().__init__(game)
+        self.path = path
+        self.retry_interval = retry_interval
+        self.scheduler = PollScheduler(game) if game else None
+        self.reader = None
+        self.writer = None
+        self.task = None
+
+    async def connect(self):
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+                return
+            except OSError:
+                await asyncio.sleep(self.retry_interval)
+
+    async def pump(self):
+        while True:
+            if self.reader is None:
+                await self.connect()
+            line = await self.reader.readline()
+            if not line:
+                self.disconnect()
+                continue
+            event = json.loads(line)
+            if self.scheduler is not None and event["game"] == self.game:
+                self.scheduler.observe(event)
+            self.put(event)
+
+    async def next_event(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.pump())
+        return await self.queue.get()
+
+    def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.task = None
+        self.disconnect()
+
+
+async def serve(path=SOCKET_PATH, games=GAMES):
+    publisher = RoundPublisher(path)
+    await publisher.start()
+    client = BlazeClientAPI()
+    pollers = [RoundPoller(game, client=client) for game in games]
+    for poller in pollers:
+        poller.subscribers.add(publisher)
+    try:
+        await asyncio.gather(*(poller.run() for poller in pollers))
+    finally:
+        publisher.close()
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(*sys.argv[1:2]))
@@ -0,0 +1,265 @@
+import sys
+import time
+import signal
+import asyncio
+import importlib
+import multiprocessing
+from bot.api import BlazeClientAPI
+from bot.controllers import shard_count
+from bot.async_controllers import AsyncUserController
+from bot.poller import RoundPoller
+from bot.matcher import MatcherRegistry
+from bot.transport import AsyncTransport
+from bot.sweeper import ExpirationSweeper
+from bot.outbox import OutboxDispatcher
+from bot.db.database import engine
+
+
+def load_target(target):
+    module_name, _, function_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), function_name or "run_bot")
+
+
+class BotHost(object):
+
+    def __init__(self, shard_id, shards, target, interval=5, max_backoff=60, matcher_interval=60):
+        self.shard_id = shard_id
+        self.shards = shards
+        self.target = load_target(target) if isinstance(target, str) else target
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.matcher_interval = matcher_interval
+        self.matched_at = None
+        self.matchers = MatcherRegistry()
+        self.controller = AsyncUserController()
+        # writes made through this controller refresh the shard's matchers once committed
+        self.controller.matchers = self.matchers
+        self.transport = AsyncTransport()
+        self.pollers = {}
+        self.tasks = {}
+        self.owners = {}
+        self.failures = {}
+        self.stopped = asyncio.Event()
+
+    def load_shard(self, session):
+        model = self.controller.model
+        users = session.query(model.id, model.user_bot, model.shard_id) \
+            .filter(model.is_active.is_(True), model.user_bot % self.shards == self.shard_id).all()
+        # enable records the shard for the configured count; claim users when the runtime runs with another
+        moved = [uid for uid, _, shard_id in users if shard_id != self.shard_id]
+        if moved:
+            session.query(model).filter(model.id.in_(moved)).update({model.shard_id: self.shard_id},
+                                                                     synchronize_session=False)
+        return {user_bot: uid for uid, user_bot, _ in users}
+
+    def poller(self, game):
+        game = str(game or "double").lower()
+        if game not in self.pollers:
+            poller = RoundPoller(game, BlazeClientAPI(transport=self.transport), self.matchers.matcher(game))
+            self.pollers[game] = (poller, asyncio.create_task(poller.run()))
+        return self.pollers[game][0]
+
+    def client(self, game="double", user_id=None):
+        client = BlazeClientAPI(transport=self.transport)
+        client.use_channel(str(game).lower(), self.poller(game).subscribe(user_id=user_id))
+        return client
+
+    def release(self, client):
+        for channel in client.channels.values():
+            channel.close()
+        client.channels.clear()
+
+    async def supervise(self, user_bot):
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            bundle = await self.controller.check_user_exists(user_bot)
+            if not bundle or not bundle["user"]["is_active"]:
+                return
+            client = self.client(bundle["user"]["game_type"], bundle["user"]["id"])
+            try:
+                await self.target(bundle, client, self.controller)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # one failing bot must not take the rest of the shard down
+                if time.monotonic() - started > self.max_backoff:
+                    self.failures[user_bot] = 0
+                self.failures[user_bot] = self.failures.get(user_bot, 0) + 1
+                delay = min(self.max_backoff, 2 ** self.failures[user_bot])
+                print(f"Bot {user_bot} falhou ({e}), reiniciando em {delay}s")
+                await asyncio.sleep(delay)
+            finally:
+                self.release(client)
+
+    def start_bot(self, user_bot):
+        task = asyncio.create_task(self.supervise(user_bot))
+        task.add_done_callback(lambda finished: self.forget(user_bot, finished))
+        self.tasks[user_bot] = task
+
+    def forget(self, user_bot, task):
+        if self.tasks.get(user_bot) is task:
+            del self.tasks[user_bot]
+
+    async def release_counters(self, uid):
+        # admin processes only reset their own write-behind store, this worker's values for the user
+        # are written now and dropped so a later enable starts from the database
+        counters = self.controller.counters
+        await asyncio.to_thread(counters.flush, [uid])
+        counters.pop(uid)
+
+    async def refresh_matchers(self, active, started):
+        # strategies edited by other processes only reach the shard on the periodic full refresh
+        if self.matched_at is None or time.monotonic() - self.matched_at >= self.matcher_interval:
+            self.matched_at = time.monotonic()
+            started = active
+        if started:
+            await self.controller.refresh_matcher(*started)
+
+    async def sync(self):
+        active = await self.controller.run("load_shard", self.load_shard)
+        started = set(active) - set(self.tasks)
+        await self.refresh_matchers(active, started)
+        for user_bot in started:
+            self.owners[user_bot] = active[user_bot]
+            await self.release_counters(active[user_bot])
+            self.start_bot(user_bot)
+        for user_bot in set(self.tasks) - set(active):
+            task = self.tasks.pop(user_bot)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for user_bot in set(self.owners) - set(active):
+            uid = self.owners.pop(user_bot)
+            self.matchers.remove_user(uid)
+            await self.release_counters(uid)
+        return len(active)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signal_number, self.stopped.set)
+        while not self.stopped.is_set():
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Erro ao sincronizar shard {self.shard_id}: {e}")
+            try:
+                await asyncio.wait_for(self.stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.close()
+
+    async def close(self):
+        tasks = list(self.tasks.values()) + [task for _, task in self.pollers.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+        self.pollers.clear()
+        # forked workers exit without running atexit, so the write-behind flush has to happen here
+        await asyncio.to_thread(self.controller.counters.close)
+        await self.transport.close()
+        await self.controller.close()
+
+    def stats(self):
+        return {"shard": self.shard_id, "bots": len(self.tasks), "failures": sum(self.failures.values())}
+
+
+def run_shard(shard_id, shards, target, interval=5):
+    # connections pooled by the parent must not be shared with the child
+    engine.dispose(close=False)
+    asyncio.run(BotHost(shard_id, shards, target, interval).run())
+
+
+def run_outbox():
+    engine.dispose(close=False)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(OutboxDispatcher().run())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_sweeper(interval=60):
+    engine.dispose(close=False)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        ExpirationSweeper(interval=interval).run()
+    except KeyboardInterrupt:
+        pass
+
+
+class Runtime(object):
+
+    def __init__(self, target, shards=None, interval=5, max_backoff=60, sweeper=True, outbox=True,
+                 sweep_interval=60):
+        self.target = target
+        self.shards = shards or shard_count()
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.sweeper = sweeper
+        self.sweep_interval = sweep_interval
+        self.outbox = outbox
+        self.processes = {}
+        self.restarts = {}
+        self.started_at = {}
+        self.stopped = False
+
+    def spawn(self, shard_id):
+        if shard_id == "outbox":
+            process = multiprocessing.Process(target=run_outbox, name="bot-outbox")
+        elif shard_id == "sweeper":
+            # a sweeper thread in the parent could hold a lock at the moment a shard is forked
+            process = multiprocessing.Process(target=run_sweeper, name="bot-sweeper", args=(self.sweep_interval,))
+        else:
+            process = multiprocessing.Process(target=run_shard, name=f"bot-shard-{shard_id}",
+                                              args=(shard_id, self.shards, self.target, self.interval))
+        process.start()
+        self.processes[shard_id] = process
+        self.started_at[shard_id] = time.monotonic()
+        return process
+
+    def supervise(self):
+        for shard_id, process in list(self.processes.items()):
+            if process.is_alive() or self.stopped:
+                continue
+            if time.monotonic() - self.started_at[shard_id] > self.max_backoff:
+                self.restarts[shard_id] = 0
+            self.restarts[shard_id] = self.restarts.get(shard_id, 0) + 1
+            delay = min(self.max_backoff, 2 ** self.restarts[shard_id])
+            print(f"{process.name} saiu com código {process.exitcode}, reiniciando em {delay}s")
+            time.sleep(delay)
+            self.spawn(shard_id)
+
+    def start(self):
+        for shard_id in range(self.shards):
+            self.spawn(shard_id)
+        if self.outbox:
+            self.spawn("outbox")
+        if self.sweeper:
+            self.spawn("sweeper")
+        return self
+
+    def run(self):
+        self.start()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            while not self.stopped:
+                self.supervise()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self, timeout=10):
+        self.stopped = True
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+
+
+if __name__ == "__main__":
+    Runtime(sys.argv[1], *map(int, sys.argv[2:3])).run()
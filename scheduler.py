@@ -0,0 +1,102 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+from bot.metrics import metrics
+
+PHASE_DURATIONS = {
+    "double": {"waiting": 15.0, "rolling": 7.5, "complete": 3.0},
+    "crash": {"waiting": 6.0, "graphing": None, "complete": 3.0},
+}
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+class PollScheduler(object):
+
+    def __init__(self, game="double", interval=0.1, guard=0.4, max_sleep=5.0, history=100):
+        self.game = game
+        self.interval = interval
+        self.guard = guard
+        self.max_sleep = max_sleep
+        self.durations = dict(PHASE_DURATIONS.get(game, {}))
+        self.offset = None
+        self.phase = None
+        self.phase_start = None
+        self.result_id = None
+        self.requests = 0
+        self.rounds = deque(maxlen=history)
+
+    def observe(self, data, now=None):
+        now = time.time() if now is None else now
+        status = data.get("status")
+        phase_start = parse_timestamp(data.get("updated_at") or data.get("created_at"))
+        if phase_start is not None:
+            sample = now - phase_start
+            if self.offset is None or sample < self.offset:
+                self.offset = sample
+        if status != self.phase:
+            if self.phase is not None and self.phase_start is not None and phase_start is not None:
+                self.learn(self.phase, phase_start - self.phase_start)
+            self.phase = status
+            self.phase_start = phase_start
+        finished = data.get("crash_point") is not None if self.game == "crash" \
+            else data.get("color") is not None and data.get("roll") is not None
+        if finished and data.get("id") != self.result_id:
+            self.result_id = data.get("id")
+            if self.phase_start is not None and self.offset is not None:
+                metrics.observe("round_result_detected_seconds", now - self.phase_start - self.offset, game=self.game)
+            self.rounds.append(self.requests)
+            self.requests = 0
+
+    def learn(self, phase, duration):
+        expected = self.durations.get(phase)
+        if expected is None or duration <= 0:
+            return
+        self.durations[phase] = min(duration, 0.8 * expected + 0.2 * duration)
+
+    def next_transition(self):
+        expected = self.durations.get(self.phase)
+        if expected is None or self.phase_start is None or self.offset is None:
+            return None
+        return self.phase_start + self.offset + expected
+
+    def opened_at(self):
+        if self.phase != "waiting" or self.phase_start is None or self.offset is None:
+            return None
+        return self.phase_start + self.offset
+
+    def time_left(self, now=None):
+        opened_at = self.opened_at()
+        duration = self.durations.get("waiting")
+        if opened_at is None or duration is None:
+            return None
+        return opened_at + duration - (time.time() if now is None else now)
+
+    def next_delay(self, data=None, now=None):
+        now = time.time() if now is None else now
+        if data:
+            self.observe(data, now)
+        transition = self.next_transition()
+        if transition is None:
+            return self.interval
+        wake = transition - self.guard
+        if now >= wake:
+            return self.interval
+        return min(wake - now, self.max_sleep)
+
+    def report(self):
+        rounds = list(self.rounds)
+        return {
+            "game": self.game,
+            "rounds": len(rounds),
+            "last": rounds[-1] if rounds else None,
+            "average": sum(rounds) / len(rounds) if rounds else None,
+            "pending": self.requests
+        }
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+
+
+class Call(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    def __init__(self, ttl=0.1, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.futures = {}
+        self.results = {}
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(method, url, params=None):
+        return method, url, tuple(sorted(params.items())) if params else None
+
+    def get_fresh(self, key):
+        cached = self.results.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        return None
+
+    def store(self, key, result):
+        if self.ttl <= 0 or not result:
+            return
+        now = time.monotonic()
+        if len(self.results) >= self.maxsize:
+            self.results = {k: v for k, v in self.results.items() if v[0] > now}
+        self.results[key] = (now + self.ttl, result)
+
+    def do(self, key, func):
+        with self.lock:
+            result = self.get_fresh(key)
+            if result is not None:
+                return result
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+                self.misses += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+                if call.error is None:
+                    self.store(key, call.result)
+            call.event.set()
+        return call.result
+
+    async def async_do(self, key, func):
+        with self.lock:
+            result = self.get_fresh(key)
+            if result is not None:
+                return result
+            future = self.futures.get(key)
+            if future is not None and future.get_loop() is asyncio.get_running_loop():
+                self.shared += 1
+            else:
+                future = None
+                self.misses += 1
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(func())
+        self.futures[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            if self.futures.get(key) is future:
+                del self.futures[key]
+        with self.lock:
+            self.store(key, result)
+        return result
+
+    def stats(self):
+        requests = self.hits + self.shared + self.misses
+        return {
+            "hits": self.hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.shared) / requests if requests else 0.0
+        }
@@ -0,0 +1,149 @@
+import bisect
+import math
+from bot.history import COLOR_NAMES
+
+WINDOWS = (50, 500, 5000)
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# crash points bucketed on a log scale, about 2.5% wide between 1.00x and 1000x
+BUCKETS = [round(math.exp(index * 0.025), 4) for index in range(277)]
+
+
+def crash_color(point):
+    return 0 if point < 2 else 1
+
+
+class RollingWindow(object):
+
+    def __init__(self, size, colors, buckets=None):
+        self.size = size
+        self.items = [None] * size
+        self.index = 0
+        self.count = 0
+        self.colors = [0] * colors
+        self.histogram = [0] * (len(buckets) + 1) if buckets else None
+        self.below = 0
+
+    def push(self, color, bucket=None, below=False):
+        if self.count == self.size:
+            old_color, old_bucket, old_below = self.items[self.index]
+            self.colors[old_color] -= 1
+            if old_bucket is not None:
+                self.histogram[old_bucket] -= 1
+            self.below -= old_below
+        else:
+            self.count += 1
+        self.items[self.index] = (color, bucket, below)
+        self.index = (self.index + 1) % self.size
+        self.colors[color] += 1
+        if bucket is not None:
+            self.histogram[bucket] += 1
+        self.below += below
+
+    def quantiles(self, qs=QUANTILES):
+        values = {}
+        if not self.count or self.histogram is None:
+            return {q: None for q in qs}
+        targets = sorted(qs)
+        position = 0
+        seen = 0
+        for bucket, amount in enumerate(self.histogram):
+            seen += amount
+            while position < len(targets) and seen > targets[position] * self.count:
+                values[targets[position]] = BUCKETS[min(bucket, len(BUCKETS) - 1)]
+                position += 1
+            if position == len(targets):
+                break
+        for q in targets[position:]:
+            values[q] = BUCKETS[-1]
+        return values
+
+    def snapshot(self, names):
+        data = {"count": self.count,
+                "colors": {name: self.colors[code] / self.count if self.count else 0.0
+                           for code, name in enumerate(names)}}
+        if self.histogram is not None:
+            data["below_2"] = self.below / self.count if self.count else 0.0
+            data["quantiles"] = {f"p{int(q * 100)}": value for q, value in self.quantiles().items()}
+        return data
+
+
+class RoundStats(object):
+
+    def __init__(self, game="double", windows=WINDOWS):
+        self.game = game
+        self.names = COLOR_NAMES[game]
+        buckets = BUCKETS if game == "crash" else None
+        self.windows = {size: RollingWindow(size, len(self.names), buckets) for size in windows}
+        self.rounds = 0
+        self.last_id = None
+        self.streak_color = None
+        self.streak = 0
+        self.since = [None] * len(self.names)
+        self.cached = None
+
+    def push(self, color, point=None):
+        bucket = None
+        below = False
+        if point is not None:
+            point = float(point)
+            color = crash_color(point)
+            bucket = bisect.bisect_right(BUCKETS, point) - 1 if point >= 1 else 0
+            below = point < 2
+        for window in self.windows.values():
+            window.push(color, bucket, below)
+        self.rounds += 1
+        self.cached = None
+        if color == self.streak_color:
+            self.streak += 1
+        else:
+            self.streak_color = color
+            self.streak = 1
+        for code, since in enumerate(self.since):
+            if since is not None:
+                self.since[code] = since + 1
+        self.since[color] = 0
+
+    def update(self, data):
+        if not data:
+            return False
+        round_id = data.get("id")
+        if round_id is not None:
+            # clients sharing one instance all report the same round
+            if round_id == self.last_id:
+                return False
+            self.last_id = round_id
+        point = data.get("crash_point", data.get("point"))
+        if self.game == "crash":
+            if point is None:
+                return False
+            self.push(0, point)
+        else:
+            if data.get("color") is None:
+                return False
+            self.push(int(data["color"]))
+        return True
+
+    def load(self, store, rounds=None):
+        view = store.last(rounds or max(self.windows))
+        if self.game == "crash":
+            for point in view["crash_point"].tolist():
+                self.push(0, point)
+        else:
+            for color in view["color"].tolist():
+                self.push(color)
+        return self
+
+    def snapshot(self):
+        if self.cached is None:
+            self.cached = self.build_snapshot()
+        return self.cached
+
+    def build_snapshot(self):
+        return {
+            "game": self.game,
+            "rounds": self.rounds,
+            "streak": {"color": self.names[self.streak_color] if self.streak_color is not None else None,
+                       "length": self.streak},
+            "since": {name: self.since[code] for code, name in enumerate(self.names)},
+            "windows": {size: window.snapshot(self.names) for size, window in self.windows.items()}
+        }
@@ -0,0 +1,95 @@
+import sys
+import threading
+from datetime import datetime
+from bot.controllers import UserController, session_scope
+from bot.outbox import enqueue
+
+
+class ExpirationSweeper(object):
+
+    def __init__(self, controller=None, interval=60, batch_size=500):
+        self.controller = controller or UserController()
+        self.model = self.controller.model
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+        self.thread = None
+        self.expired = 0
+
+    def find_expired(self, session, now):
+        return session.query(self.model).filter(self.model.expire_in <= now) \
+            .order_by(self.model.expire_in).limit(self.batch_size).all()
+
+    def sweep(self, now=None):
+        now = now or datetime.now()
+        total = 0
+        while True:
+            expired, others = self.sweep_batch(now)
+            for uid in others:
+                self.controller.expire(uid, now)
+            total += len(expired) + len(others)
+            if len(expired) + len(others) < self.batch_size:
+                break
+        self.expired += total
+        return total
+
+    def sweep_batch(self, now):
+        with session_scope() as session:
+            users = self.find_expired(session, now)
+            expired = [user for user in users if user.payment_status == "PAID" or user.is_testing]
+            others = [user.id for user in users if user.payment_status != "PAID" and not user.is_testing]
+            if not expired:
+                return [], others
+            ids = [user.id for user in expired]
+            snapshots = [self.snapshot(user) for user in expired]
+            self.controller.counters.flush(ids)
+            for uid in ids:
+                self.controller.counters.pop(uid)
+            session.query(self.model).filter(self.model.id.in_(ids)).update({
+                self.model.payment_status: "PENDING",
+                self.model.hashed_token: None,
+                self.model.is_active: False,
+                self.model.is_betting: False,
+                self.model.created_at: None,
+                self.model.expire_in: None
+            }, synchronize_session=False)
+            session.query(self.model).filter(self.model.id.in_(ids), self.model.already_tested.is_(True)) \
+                .update({self.model.is_testing: False}, synchronize_session=False)
+            for snapshot in snapshots:
+                enqueue(session, "info", snapshot, hashed_token=None)
+        self.controller.invalidate(*[snapshot.user_bot for snapshot in snapshots])
+        self.controller.refresh_matcher(*[snapshot.user_bot for snapshot in snapshots])
+        return snapshots, others
+
+    def snapshot(self, user):
+        values = user.as_dict()
+        values.update(payment_status="PENDING", hashed_token=None, is_active=False, is_betting=False,
+                      created_at=None, expire_in=None)
+        if user.already_tested:
+            values["is_testing"] = False
+        return self.model(**values)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Erro ao expirar usuários: {e}")
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, name="expiration-sweeper", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+
+if __name__ == "__main__":
+    ExpirationSweeper(interval=int(sys.argv[1]) if len(sys.argv) > 1 else 60).run()
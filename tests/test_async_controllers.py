@@ -0,0 +1,280 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from bot import controllers
+from bot.controllers import UserController, check_hashed_token
+from bot.async_controllers import AsyncUserController, create_async_session_factory
+from bot.counters import variables_store
+from bot.db.database import DBSession
+from bot.models import Base, User, Variables, Outbox
+
+
+def user_data(index, strategies=1, **user):
+    data = {"user": {"user_bot": index, "email": f"user{index}@mail.com", "password": "secret",
+                     "account_type": "DEMO", "game_type": "DOUBLE", "token": "token", "wallet": "1",
+                     "is_active": True, "process_pid": None, "is_betting": False,
+                     "color_bet": None, "color_before": None},
+            "strategies": [{"sequence": "V,V,P", "color": "P"} for _ in range(strategies)],
+            "variables": {"count_win": 0, "count_loss": 0, "profit": 0.0},
+            "settings": {"enter_value": 2.0, "protection_value": 1.0}}
+    data["user"].update(user)
+    return data
+
+
+def reset_state():
+    UserController.cache.clear()
+    with variables_store.lock:
+        variables_store.values.clear()
+        variables_store.dirty.clear()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / "bot.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    previous = DBSession.kw.get("bind")
+    # the write-behind store and the sync controller share the global session factory
+    DBSession.configure(bind=engine)
+    monkeypatch.setattr(controllers, "get_secret_key", lambda: "test-secret")
+    reset_state()
+    yield path, sessionmaker(bind=engine)
+    variables_store.flush()
+    reset_state()
+    DBSession.configure(bind=previous)
+    engine.dispose()
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def controller(database, loop):
+    path, _ = database
+    controller = AsyncUserController(create_async_session_factory(f"sqlite:///{path}"))
+    yield controller
+    loop.run_until_complete(controller.close())
+
+
+@pytest.fixture
+def session(database):
+    _, factory = database
+    session = factory()
+    yield session
+    session.close()
+
+
+def test_create_and_check_user_exists(controller, loop):
+    created = loop.run_until_complete(controller.create(user_data(1, strategies=2)))
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    assert bundle["user"]["id"] == created["user"]["id"]
+    assert bundle["user"]["email"] == "user1@mail.com"
+    assert len(bundle["strategies"]) == 2
+    assert bundle["variables"]["count_win"] == 0
+    assert loop.run_until_complete(controller.check_user_exists(2)) is False
+
+
+def test_create_rejects_email_in_use(controller, loop):
+    loop.run_until_complete(controller.create(user_data(1)))
+    result = loop.run_until_complete(controller.create(user_data(2, email="user1@mail.com")))
+    assert result == {"result": False, "message": "Email já está em uso..."}
+
+
+def test_check_user_exists_expires_trial(controller, loop, session):
+    created = loop.run_until_complete(controller.create(user_data(1)))
+    loop.run_until_complete(controller.create_trial_access(user_data(1), days=1))
+    session.query(User).filter_by(id=created["user"]["id"]) \
+        .update({User.expire_in: datetime.now() - timedelta(minutes=1)})
+    session.commit()
+    UserController.cache.clear()
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    assert bundle["user"]["payment_status"] == "PENDING"
+    assert bundle["user"]["is_testing"] is False
+    assert bundle["user"]["is_active"] is False
+    assert bundle["user"]["expire_in"] is None
+    assert [message.kind for message in session.query(Outbox).order_by(Outbox.id)] == ["trial", "info"]
+
+
+def test_enable_and_disable_keep_write_behind_values(controller, loop, session):
+    created = loop.run_until_complete(controller.create(user_data(1)))
+    uid = created["user"]["id"]
+    loop.run_until_complete(controller.enable(user_data(1)))
+    assert loop.run_until_complete(controller.check_user_exists(1))["user"]["is_active"] is True
+    controller.update_variables(uid, count_win=3, profit=5.5)
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    assert (bundle["variables"]["count_win"], bundle["variables"]["profit"]) == (3, 5.5)
+    loop.run_until_complete(controller.disable(user_data(1, is_active=False)))
+    assert variables_store.get(uid) is None
+    variables = session.query(Variables).filter_by(owner_id=uid).one()
+    assert (variables.count_win, variables.profit) == (3, 5.5)
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    assert bundle["user"]["is_active"] is False
+    assert bundle["variables"]["count_win"] == 3
+
+
+def test_failed_disable_keeps_write_behind_values(controller, loop, session, monkeypatch):
+    created = loop.run_until_complete(controller.create(user_data(1)))
+    uid = created["user"]["id"]
+    controller.update_variables(uid, count_win=4)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("falha no commit")
+
+    monkeypatch.setattr(controller, "create_user_settings", fail)
+    with pytest.raises(RuntimeError):
+        loop.run_until_complete(controller.disable(user_data(1, is_active=False)))
+    assert variables_store.get(uid)["count_win"] == 4
+    variables_store.flush()
+    assert session.query(Variables).filter_by(owner_id=uid).one().count_win == 4
+
+
+def test_enable_resets_write_behind_values(controller, loop):
+    created = loop.run_until_complete(controller.create(user_data(1)))
+    controller.update_variables(created["user"]["id"], count_win=7)
+    loop.run_until_complete(controller.enable(user_data(1)))
+    assert variables_store.get(created["user"]["id"]) is None
+    assert loop.run_until_complete(controller.check_user_exists(1))["variables"]["count_win"] == 0
+
+
+def test_change_bets_status(controller, loop):
+    loop.run_until_complete(controller.create(user_data(1)))
+    loop.run_until_complete(controller.check_user_exists(1))
+    loop.run_until_complete(controller.change_bets_status(user_data(1, is_betting=True)))
+    assert loop.run_until_complete(controller.check_user_exists(1))["user"]["is_betting"] is True
+
+
+def test_change_payment_status_by_email(controller, loop):
+    loop.run_until_complete(controller.create(user_data(1)))
+    loop.run_until_complete(controller.change_payment_status(
+        {"user": {"email": "user1@mail.com", "payment_status": "PAID"}}))
+    assert loop.run_until_complete(controller.check_user_exists(1))["user"]["payment_status"] == "PAID"
+
+
+def test_change_payment_status_by_payment_id(controller, loop, session):
+    loop.run_until_complete(controller.create(user_data(1)))
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    bundle["user"].update(payment_id="pay-1", payment_expire_in=30)
+    loop.run_until_complete(controller.create(bundle))
+    loop.run_until_complete(controller.change_payment_status(
+        {"user": {"payment_id": "pay-1", "payment_status": "PAID"}}))
+    user = loop.run_until_complete(controller.check_user_exists(1))["user"]
+    assert user["payment_status"] == "PAID"
+    assert user["payment_id"] is None
+    assert user["expire_in"] - user["created_at"] == timedelta(days=30)
+    assert session.query(Outbox).filter_by(kind="info").count() == 1
+
+
+def test_create_trial_access(controller, loop, session):
+    loop.run_until_complete(controller.create(user_data(1)))
+    bundle = loop.run_until_complete(controller.create_trial_access(user_data(1), days=1))
+    assert bundle["user"]["is_testing"] is True
+    assert bundle["user"]["already_tested"] is True
+    assert check_hashed_token("1", bundle["user"]["hashed_token"])
+    assert bundle["user"]["expire_in"] - bundle["user"]["created_at"] == timedelta(days=1)
+    assert session.query(Outbox).filter_by(kind="trial").count() == 1
+
+
+def test_change_token_status(controller, loop):
+    created = loop.run_until_complete(controller.create(user_data(1)))
+    bundle = loop.run_until_complete(controller.change_token_status(created["user"]["id"], days=30))
+    assert bundle["user"]["payment_status"] == "PAID"
+    assert bundle["user"]["expire_in"] - bundle["user"]["created_at"] == timedelta(days=30)
+    bundle = loop.run_until_complete(controller.change_token_status(created["user"]["id"], client_id=1))
+    assert bundle["user"]["payment_status"] == "PENDING"
+    assert bundle["user"]["expire_in"] is None
+
+
+def test_delete(controller, loop):
+    first = loop.run_until_complete(controller.create(user_data(1)))
+    loop.run_until_complete(controller.create(user_data(2)))
+    loop.run_until_complete(controller.check_user_exists(1))
+    remaining = loop.run_until_complete(controller.delete(first["user"]["id"]))
+    assert [bundle["user"]["user_bot"] for bundle in remaining] == [2]
+    assert loop.run_until_complete(controller.check_user_exists(1)) is False
+
+
+def test_delete_strategies(controller, loop):
+    loop.run_until_complete(controller.create(user_data(1, strategies=2)))
+    bundle = loop.run_until_complete(controller.check_user_exists(1))
+    loop.run_until_complete(controller.delete_strategies(bundle, 0))
+    strategies = loop.run_until_complete(controller.check_user_exists(1))["strategies"]
+    assert [strategy["id"] for strategy in strategies] == [bundle["strategies"][1]["id"]]
+
+
+def test_read_and_iter_users_paginate(controller, loop):
+    for index in range(1, 8):
+        loop.run_until_complete(controller.create(user_data(index, game_type="CRASH" if index % 2 else "DOUBLE")))
+    first = loop.run_until_complete(controller.read(limit=3))
+    assert [bundle["user"]["user_bot"] for bundle in first] == [7, 6, 5]
+    second = loop.run_until_complete(controller.read(limit=3, before_id=first[-1]["user"]["id"]))
+    assert [bundle["user"]["user_bot"] for bundle in second] == [4, 3, 2]
+    assert [bundle["user"]["user_bot"] for bundle in
+            loop.run_until_complete(controller.read(game_type="DOUBLE"))] == [6, 4, 2]
+    assert loop.run_until_complete(controller.read(active=True)) is None
+
+    async def collect(**kwargs):
+        return [bundle["user"]["user_bot"] async for bundle in controller.iter_users(**kwargs)]
+
+    assert loop.run_until_complete(collect(batch_size=3)) == [7, 6, 5, 4, 3, 2, 1]
+    assert loop.run_until_complete(collect(batch_size=2, game_type="CRASH")) == [7, 5, 3, 1]
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, datetime):
+        # both runs stamp dates with the wall clock, only whether they are set can be compared
+        return "datetime"
+    return value
+
+
+def scenario(call):
+    results = [call("create", user_data(index, strategies=2)) for index in range(1, 5)]
+    uid = results[0]["user"]["id"]
+    results.append(call("check_user_exists", 1))
+    results.append(call("enable", user_data(1)))
+    results.append(call("change_bets_status", user_data(1, is_betting=True)))
+    results.append(call("check_user_exists", 1))
+    results.append(call("disable", user_data(1, is_active=False)))
+    results.append(call("create_trial_access", user_data(2), days=1))
+    results.append(call("change_payment_status", {"user": {"email": "user3@mail.com", "payment_status": "PAID"}}))
+    results.append(call("change_token_status", results[3]["user"]["id"], days=30))
+    results.append(call("delete_strategies", call("check_user_exists", 1), 0))
+    results.append(call("check_user_exists", 1))
+    results.append(call("delete", uid))
+    results.append(call("read", 2))
+    results.append(call("read"))
+    return normalize(results)
+
+
+def test_sync_and_async_controllers_agree(tmp_path, monkeypatch, loop):
+    monkeypatch.setattr(controllers, "get_secret_key", lambda: "test-secret")
+    previous = DBSession.kw.get("bind")
+    results = {}
+    for name in ("sync", "async"):
+        path = tmp_path / f"{name}.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        DBSession.configure(bind=engine)
+        reset_state()
+        if name == "sync":
+            controller = UserController()
+            results[name] = scenario(lambda method, *args, **kwargs: getattr(controller, method)(*args, **kwargs))
+        else:
+            controller = AsyncUserController(create_async_session_factory(f"sqlite:///{path}"))
+            results[name] = scenario(lambda method, *args, **kwargs:
+                                     loop.run_until_complete(getattr(controller, method)(*args, **kwargs)))
+            loop.run_until_complete(controller.close())
+        variables_store.flush()
+        engine.dispose()
+    reset_state()
+    DBSession.configure(bind=previous)
+    assert results["sync"] == results["async"]
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from bot import controllers
+from bot.controllers import UserController, session_scope
+from bot.counters import variables_store
+from bot.db.database import DBSession
+from bot.models import Base, User
+from bot.sweeper import ExpirationSweeper
+
+
+def user_data(index, **user):
+    data = {"user": {"user_bot": index, "email": f"user{index}@mail.com", "password": "secret",
+                     "account_type": "DEMO", "game_type": "DOUBLE", "token": "token", "wallet": "1",
+                     "is_active": True, "process_pid": None, "is_betting": False,
+                     "color_bet": None, "color_before": None},
+            "strategies": [{"sequence": "V,V,P", "color": "P"}],
+            "variables": {"count_win": 0, "count_loss": 0, "profit": 0.0},
+            "settings": {"enter_value": 2.0, "protection_value": 1.0}}
+    data["user"].update(user)
+    return data
+
+
+def reset_state():
+    UserController.cache.clear()
+    with variables_store.lock:
+        variables_store.values.clear()
+        variables_store.dirty.clear()
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bot.db'}")
+    Base.metadata.create_all(bind=engine)
+    previous = DBSession.kw.get("bind")
+    DBSession.configure(bind=engine)
+    monkeypatch.setattr(controllers, "get_secret_key", lambda: "test-secret")
+    reset_state()
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    variables_store.flush()
+    reset_state()
+    DBSession.configure(bind=previous)
+    engine.dispose()
+
+
+@pytest.fixture
+def controller(session):
+    controller = UserController()
+    controller.create(user_data(1))
+    return controller
+
+
+def expire_in_database(session, delta=timedelta(minutes=1)):
+    session.query(User).filter_by(user_bot=1).update({User.expire_in: datetime.now() - delta})
+    session.commit()
+
+
+def cached(key):
+    return UserController.cache.data.get(key) is not None
+
+
+def test_check_user_exists_reads_through_cache(controller):
+    before = UserController.cache.stats()
+    bundle = controller.check_user_exists(1)
+    assert cached(1)
+    bundle["user"]["email"] = "changed@mail.com"
+    assert controller.check_user_exists(1)["user"]["email"] == "user1@mail.com"
+    after = UserController.cache.stats()
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (1, 1)
+
+
+def update_name(controller, uid):
+    bundle = controller.check_user_exists(1)
+    bundle["user"]["name"] = "Novo nome"
+    controller.create(bundle)
+
+
+INVALIDATIONS = {
+    "update": (update_name, lambda user: user["name"] == "Novo nome"),
+    "enable": (lambda controller, uid: controller.enable(user_data(1)),
+               lambda user: user["is_active"] is True and user["shard_id"] is not None),
+    "disable": (lambda controller, uid: controller.disable(user_data(1, is_active=False)),
+                lambda user: user["is_active"] is False),
+    "change_bets_status": (lambda controller, uid: controller.change_bets_status(user_data(1, is_betting=True)),
+                           lambda user: user["is_betting"] is True),
+    "change_payment_status": (lambda controller, uid: controller.change_payment_status(
+        {"user": {"email": "user1@mail.com", "payment_status": "PAID"}}),
+                              lambda user: user["payment_status"] == "PAID"),
+    "change_token_status": (lambda controller, uid: controller.change_token_status(uid, days=30),
+                            lambda user: user["payment_status"] == "PAID" and user["expire_in"] is not None),
+}
+
+
+@pytest.mark.parametrize("method", sorted(INVALIDATIONS))
+def test_writes_invalidate_cached_bundle(controller, method):
+    change, check = INVALIDATIONS[method]
+    uid = controller.check_user_exists(1)["user"]["id"]
+    assert cached(1)
+    change(controller, uid)
+    assert not cached(1)
+    assert check(controller.check_user_exists(1)["user"])
+
+
+def test_delete_invalidates_cached_bundle(controller):
+    uid = controller.check_user_exists(1)["user"]["id"]
+    controller.delete(uid)
+    assert not cached(1)
+    assert controller.check_user_exists(1) is False
+
+
+def test_expired_cache_hit_reloads_after_sweep(controller, session):
+    uid = controller.check_user_exists(1)["user"]["id"]
+    controller.change_token_status(uid, days=30)
+    expire_in_database(session)
+    with session_scope() as scope:
+        stale = controller.load_bundle(scope, 1)
+    assert ExpirationSweeper(controller).sweep() == 1
+    # the sweeper ran in another process, this one still holds the paid bundle
+    UserController.cache.set(1, stale)
+    user = controller.check_user_exists(1)["user"]
+    assert user["payment_status"] == "PENDING"
+    assert user["expire_in"] is None
+    assert user["hashed_token"] is None
+
+
+def test_expire_rechecks_expiry_in_transaction(controller, session):
+    uid = controller.check_user_exists(1)["user"]["id"]
+    controller.change_token_status(uid, days=30)
+    user = controller.expire(uid)["user"]
+    assert user["payment_status"] == "PAID"
+    assert user["expire_in"] > datetime.now()
+    expire_in_database(session)
+    user = controller.check_user_exists(1)["user"]
+    assert user["payment_status"] == "PENDING"
+    assert user["expire_in"] is None
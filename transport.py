@@ -0,0 +1,100 @@
+import json
+import asyncio
+
+
+class AsyncResponse(object):
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self._json = None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        if self._json is None:
+            self._json = json.loads(self.content) if self.content else None
+        return self._json
+
+
+class PreparedRequest(object):
+
+    def __init__(self, method, url, data, headers):
+        self.method = method
+        self.url = url
+        self.data = data
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.headers = dict(headers)
+        self.headers["content-type"] = "application/json"
+
+
+class AsyncTransport(object):
+
+    def __init__(self, timeout=15, limit=100, keepalive_timeout=75, dns_ttl=300):
+        self.timeout = timeout
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.session = None
+        self.warm_task = None
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=self.dns_ttl)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    @staticmethod
+    def get_proxy(proxies):
+        if not proxies:
+            return None
+        return proxies.get("https") or proxies.get("http")
+
+    async def request(self, method, url, proxies=None, **kwargs):
+        session = self.get_session()
+        async with session.request(method, url, proxy=self.get_proxy(proxies), **kwargs) as response:
+            content = await response.read()
+            return AsyncResponse(response.status, content, dict(response.headers))
+
+    async def send(self, prepared, proxies=None):
+        session = self.get_session()
+        async with session.request(prepared.method, prepared.url, data=prepared.body,
+                                   headers=prepared.headers, proxy=self.get_proxy(proxies)) as response:
+            content = await response.read()
+            return AsyncResponse(response.status, content, dict(response.headers))
+
+    async def warmup(self, url, connections=2, headers=None, proxies=None):
+        results = await asyncio.gather(*(self.request("GET", url, headers=headers, proxies=proxies)
+                                         for _ in range(connections)), return_exceptions=True)
+        return sum(1 for result in results if isinstance(result, AsyncResponse))
+
+    async def keep_warm(self, url, interval=30, connections=2, headers=None, proxies=None):
+        while True:
+            try:
+                await self.warmup(url, connections=connections, headers=headers, proxies=proxies)
+            except Exception as e:
+                pass
+            await asyncio.sleep(interval)
+
+    def start_keep_warm(self, url, interval=30, connections=2, headers=None, proxies=None):
+        if self.warm_task is None or self.warm_task.done():
+            self.warm_task = asyncio.ensure_future(self.keep_warm(url, interval, connections, headers, proxies))
+        return self.warm_task
+
+    async def close(self):
+        if self.warm_task is not None:
+            self.warm_task.cancel()
+            self.warm_task = None
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
@@ -0,0 +1,125 @@
+import time
+from bot.metrics import metrics
+
+DOUBLE_PAYOUTS = {0: 14, 1: 2, 2: 2}
+
+
+class BalanceTracker(object):
+
+    def __init__(self, fetch, interval=300, tolerance=0.01, retries=3, backoff=0.5, max_backoff=5.0):
+        self.fetch = fetch
+        self.interval = interval
+        self.tolerance = tolerance
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.data = None
+        self.balance = None
+        self.initial = None
+        self.synced_at = None
+        self.stale = True
+        self.pending = {}
+        self.settled = {}
+        self.drifts = 0
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return self.stale or self.synced_at is None or now - self.synced_at >= self.interval
+
+    def fetch_with_retry(self):
+        for attempt in range(self.retries):
+            data = None
+            try:
+                data = self.fetch()
+            except Exception as e:
+                pass
+            if data:
+                return data
+            if attempt < self.retries - 1:
+                time.sleep(min(self.max_backoff, self.backoff * 2 ** attempt))
+        return None
+
+    def reconcile(self):
+        data = self.fetch_with_retry()
+        if not data:
+            metrics.increment("wallet_syncs_total", status="error")
+            print("Não foi possível sincronizar o saldo, mantendo o valor local")
+            return False
+        server = float(data["balance"])
+        if self.balance is not None and abs(server - self.balance) > self.tolerance:
+            self.drifts += 1
+            metrics.increment("wallet_syncs_total", status="drift")
+            print(f"Saldo divergente: local {self.balance:.2f}, servidor {server:.2f}")
+        else:
+            metrics.increment("wallet_syncs_total", status="ok")
+        self.data = data
+        self.balance = server
+        if self.initial is None:
+            self.initial = server
+        self.synced_at = time.time()
+        self.stale = False
+        return True
+
+    def get(self, force=False):
+        if force or self.due():
+            self.reconcile()
+        if self.data is None:
+            return None
+        balance = self.data["balance"]
+        return dict(self.data, balance=f"{self.balance:.2f}" if isinstance(balance, str) else self.balance)
+
+    def invalidate(self):
+        self.stale = True
+
+    def debit(self, game, amount, color=None, cashout=None):
+        if self.balance is None:
+            self.stale = True
+            return
+        amount = float(amount)
+        self.balance -= amount
+        self.pending.setdefault(game, []).append({"amount": amount, "color": color, "cashout": cashout})
+
+    def credit(self, amount):
+        if self.balance is not None:
+            self.balance += float(amount)
+
+    def cashout(self, game):
+        # a manual cashout pays the multiplier of that instant, which only the server knows
+        for bet in self.pending.get(game, ()):
+            bet["cashout"] = None
+        self.stale = True
+
+    def payout(self, game, bet, data):
+        if game == "crash":
+            if bet["cashout"] is None or data.get("crash_point") is None:
+                return None
+            return bet["amount"] * bet["cashout"] if float(data["crash_point"]) >= bet["cashout"] else 0.0
+        if data.get("color") is None:
+            return None
+        return bet["amount"] * DOUBLE_PAYOUTS[data["color"]] if bet["color"] == data["color"] else 0.0
+
+    def settle(self, game, data):
+        if not data or self.settled.get(game) == data.get("id"):
+            return
+        self.settled[game] = data.get("id")
+        for bet in self.pending.pop(game, ()):
+            amount = self.payout(game, bet, data)
+            if amount is None:
+                self.stale = True
+            else:
+                self.credit(amount)
+
+    @property
+    def profit(self):
+        if self.balance is None or self.initial is None:
+            return 0.0
+        return self.balance - self.initial
+
+    def report(self):
+        return {
+            "balance": self.balance,
+            "profit": self.profit,
+            "synced_at": self.synced_at,
+            "pending": sum(len(bets) for bets in self.pending.values()),
+            "drifts": self.drifts
+        }